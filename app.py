@@ -1,167 +1,329 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import asyncio
+import contextlib
+import contextvars
+import functools
+import gzip
+import hashlib
+import importlib.util
+import json
+import math
 import random
+import re
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import card_images
+from card_registry import Card, json_default, load_card_registry
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from context_classifier import load_context_classifier
+from metrics import Registry
+from rate_limit import InMemoryBucketStore, RedisBucketStore, TokenBucketLimiter
+from reading_cache import ReadingCache, normalize_question
+from reading_store import open_reading_store
+from singleflight import AsyncSingleFlight, SingleFlight
+from upstream_slots import SlotTimeout, UpstreamSlots
+from tracing import REQUEST_ID_HEADER, begin_trace, end_trace, get_logger, request_id_from, span
+from spreads import (
+    SPREAD_SYSTEM_PROMPT,
+    SPREADS,
+    build_spread_block,
+    draw_spread,
+    generate_fallback_spread_reading,
+    parse_spread_reading,
+)
+
+class CardJSONProvider(DefaultJSONProvider):
+    """jsonify() support for Card records (spreads, errors); hot paths splice precomputed bytes instead"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Card):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = CardJSONProvider(app)
+log = get_logger('app')
 
-# Try to import anthropic, fallback if not available
+# Brotli is optional - gzip is always available for the home page
 try:
-    import anthropic
-    ANTHROPIC_AVAILABLE = True
-    ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
-    client = None  # Initialize as None first
-    
-    if ANTHROPIC_API_KEY:
-        try:
-            # Try to create the client, but catch any errors
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            print("✅ Anthropic API configured")
-        except Exception as e:
-            # If client creation fails, don't crash - just use fallback
-            print(f"⚠️ Anthropic client initialization failed: {e}")
-            ANTHROPIC_AVAILABLE = False
-            client = None
-    else:
-        print("⚠️ ANTHROPIC_API_KEY not set - using fallback readings")
-        ANTHROPIC_AVAILABLE = False
-        client = None
+    import brotli
+    BROTLI_AVAILABLE = True
 except ImportError:
-    print("⚠️ Anthropic library not installed - using fallback readings")
+    BROTLI_AVAILABLE = False
+
+# The SDK (and httpx, pydantic under it) is imported with the first AI
+# reading rather than at startup: most cold starts serve pages that never
+# call it. find_spec only looks the package up, it doesn't import it.
+ANTHROPIC_AVAILABLE = importlib.util.find_spec('anthropic') is not None
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+_anthropic_clients = None
+_anthropic_clients_lock = threading.Lock()
+
+if not ANTHROPIC_AVAILABLE:
+    log.warning("⚠️ Anthropic library not installed - using fallback readings")
+elif not ANTHROPIC_API_KEY:
+    log.warning("⚠️ ANTHROPIC_API_KEY not set - using fallback readings")
     ANTHROPIC_AVAILABLE = False
-    client = None
-
-CARDS = [
-    {"name": "The Fool", "symbol": "🌟", "meaning": "New beginnings, spontaneity, innocence", 
-     "keywords": ["new start", "adventure", "leap of faith", "innocence", "potential"]},
-    {"name": "The Magician", "symbol": "🎭", "meaning": "Manifestation, resourcefulness, power", 
-     "keywords": ["manifestation", "skill", "concentration", "action", "resourcefulness"]},
-    {"name": "The High Priestess", "symbol": "🌙", "meaning": "Intuition, sacred knowledge, divine feminine", 
-     "keywords": ["intuition", "mystery", "subconscious", "wisdom", "spiritual insight"]},
-    {"name": "The Empress", "symbol": "👸", "meaning": "Femininity, beauty, nature, nurturing", 
-     "keywords": ["fertility", "femininity", "beauty", "nature", "abundance"]},
-    {"name": "The Emperor", "symbol": "👑", "meaning": "Authority, establishment, structure", 
-     "keywords": ["authority", "father figure", "structure", "control", "power"]},
-    {"name": "The Hierophant", "symbol": "⛪", "meaning": "Spiritual wisdom, religious beliefs, tradition", 
-     "keywords": ["tradition", "conformity", "morality", "ethics", "knowledge"]},
-    {"name": "The Lovers", "symbol": "💕", "meaning": "Love, harmony, relationships, values", 
-     "keywords": ["love", "harmony", "relationships", "values", "choices"]},
-    {"name": "The Chariot", "symbol": "🏆", "meaning": "Control, willpower, success, determination", 
-     "keywords": ["control", "willpower", "success", "determination", "hard control"]},
-    {"name": "Strength", "symbol": "🦁", "meaning": "Strength, courage, persuasion, influence", 
-     "keywords": ["strength", "courage", "persuasion", "influence", "compassion"]},
-    {"name": "The Hermit", "symbol": "🕯️", "meaning": "Soul searching, introspection, inner guidance", 
-     "keywords": ["introspection", "searching", "guidance", "solitude", "inner wisdom"]},
-    {"name": "Wheel of Fortune", "symbol": "🎡", "meaning": "Good luck, karma, life cycles, destiny", 
-     "keywords": ["luck", "karma", "cycles", "destiny", "fortune"]},
-    {"name": "Justice", "symbol": "⚖️", "meaning": "Justice, fairness, truth, cause and effect", 
-     "keywords": ["justice", "fairness", "truth", "law", "karma"]},
-    {"name": "The Hanged Man", "symbol": "🙃", "meaning": "Suspension, restriction, letting go", 
-     "keywords": ["suspension", "restriction", "letting go", "sacrifice", "martyrdom"]},
-    {"name": "Death", "symbol": "💀", "meaning": "Endings, transformation, transition", 
-     "keywords": ["endings", "transformation", "transition", "change", "rebirth"]},
-    {"name": "Temperance", "symbol": "🍷", "meaning": "Balance, moderation, patience, purpose", 
-     "keywords": ["balance", "moderation", "patience", "purpose", "meaning"]},
-    {"name": "The Devil", "symbol": "😈", "meaning": "Bondage, addiction, sexuality", 
-     "keywords": ["bondage", "addiction", "sexuality", "materialism", "playfulness"]},
-    {"name": "The Tower", "symbol": "🗼", "meaning": "Sudden change, upheaval, chaos, revelation", 
-     "keywords": ["sudden change", "upheaval", "chaos", "revelation", "awakening"]},
-    {"name": "The Star", "symbol": "⭐", "meaning": "Hope, faith, purpose, renewal, spirituality", 
-     "keywords": ["hope", "faith", "purpose", "renewal", "spirituality"]},
-    {"name": "The Moon", "symbol": "🌕", "meaning": "Illusion, fear, anxiety, subconscious, intuition", 
-     "keywords": ["illusion", "fear", "anxiety", "subconscious", "intuition"]},
-    {"name": "The Sun", "symbol": "☀️", "meaning": "Positivity, fun, warmth, success, vitality", 
-     "keywords": ["positivity", "fun", "warmth", "success", "vitality"]},
-    {"name": "Judgement", "symbol": "📯", "meaning": "Judgement, rebirth, inner calling, absolution", 
-     "keywords": ["judgement", "rebirth", "inner calling", "absolution", "second chances"]},
-    {"name": "The World", "symbol": "🌍", "meaning": "Completion, accomplishment, travel", 
-     "keywords": ["completion", "accomplishment", "travel", "fulfillment", "success"]},
-]
+
+def _create_anthropic_clients():
+    global ANTHROPIC_AVAILABLE
+    try:
+        import anthropic
+        # No SDK retries - each reading has its own latency budget instead
+        clients = (anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0),
+                   anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, max_retries=0))
+        log.info("✅ Anthropic API configured")
+        return clients
+    except Exception as e:
+        # If client creation fails, don't crash - later readings use the fallback
+        log.warning(f"⚠️ Anthropic client initialization failed: {e}")
+        ANTHROPIC_AVAILABLE = False
+        return (None, None)
+
+def get_anthropic_clients():
+    """(sync, async) Anthropic clients, imported and built once on first use"""
+    global _anthropic_clients
+    if _anthropic_clients is None:
+        with _anthropic_clients_lock:
+            if _anthropic_clients is None:
+                _anthropic_clients = _create_anthropic_clients()
+    return _anthropic_clients
+
+def get_client():
+    client = get_anthropic_clients()[0]
+    if client is None:
+        raise RuntimeError("Anthropic client unavailable")
+    return client
+
+def get_async_client():
+    async_client = get_anthropic_clients()[1]
+    if async_client is None:
+        raise RuntimeError("Anthropic client unavailable")
+    return async_client
+
+# One cap on concurrent upstream calls: sync routes and async routes draw from the same slots
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv('ANTHROPIC_MAX_CONCURRENCY', '32'))
+_upstream_slots = UpstreamSlots(UPSTREAM_MAX_CONCURRENCY)
+
+# Identical readings are served from memory; fallback readings are never cached
+READING_CACHE = ReadingCache(
+    max_entries=int(os.getenv('READING_CACHE_SIZE', '1024')),
+    ttl_seconds=float(os.getenv('READING_CACHE_TTL', '3600')),
+)
+
+# Every served reading is stored so /readings/<id> replays it without a model call
+READING_STORE = open_reading_store(
+    os.getenv('READING_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'readings.sqlite3'))
+)
+# Rendered /readings/<id> responses - stored readings never change
+SHARED_READING_CACHE = ReadingCache(
+    max_entries=int(os.getenv('SHARED_READING_CACHE_SIZE', '4096')),
+    ttl_seconds=float(os.getenv('SHARED_READING_CACHE_TTL', '86400')),
+)
+
+# Concurrent requests with an identical prompt share one upstream call
+_inflight_readings = SingleFlight()
+_async_inflight_readings = AsyncSingleFlight()
+
+# Seconds an AI reading may take before the template reading is served instead
+# (for streams: the longest wait for the next chunk)
+READING_LATENCY_BUDGET = float(os.getenv('READING_LATENCY_BUDGET', '10'))
+
+# Skip the upstream call entirely while it keeps failing
+READING_BREAKER = CircuitBreaker(
+    failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', '30')),
+)
+
+# Batch readings fan out over one bounded pool shared by all batches
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '1000'))
+_batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_MAX_WORKERS', '16')),
+                                     thread_name_prefix='batch-reading')
+
+# Per-client token buckets on the draw routes (RATE_LIMIT_RATE=0 disables)
+RATE_LIMIT_TRUST_PROXY = os.getenv('RATE_LIMIT_TRUST_PROXY', '').lower() in ('1', 'true', 'yes')
+# Trusted proxies in front of the app, each appending to X-Forwarded-For; everything left of
+# the entry the outermost one added is client-supplied (RATE_LIMIT_TRUST_PROXY alone means one)
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '1' if RATE_LIMIT_TRUST_PROXY else '0'))
+# Partner API keys that get their own bucket (comma-separated); any other key is limited by IP
+RATE_LIMIT_API_KEYS = frozenset(
+    hashlib.sha256(key.strip().encode('utf-8')).hexdigest()[:32]
+    for key in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()
+)
+if os.getenv('RATE_LIMIT_REDIS_URL'):
+    _rate_limit_store = RedisBucketStore(os.getenv('RATE_LIMIT_REDIS_URL'))
+else:
+    _rate_limit_store = InMemoryBucketStore(max_buckets=int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '10000')))
+DRAW_RATE_LIMITER = TokenBucketLimiter(
+    rate=float(os.getenv('RATE_LIMIT_RATE', '0.5')),
+    burst=float(os.getenv('RATE_LIMIT_BURST', '10')),
+    store=_rate_limit_store,
+)
+# Batches draw on their own bucket, in readings per second; a batch larger than the burst is
+# refused outright. Allow-listed partner keys get a bigger bucket (BATCH_RATE_LIMIT_RATE=0 disables)
+BATCH_RATE_LIMITER = TokenBucketLimiter(
+    rate=float(os.getenv('BATCH_RATE_LIMIT_RATE', '0.5')),
+    burst=float(os.getenv('BATCH_RATE_LIMIT_BURST', '20')),
+    store=_rate_limit_store,
+)
+BATCH_PARTNER_RATE_LIMITER = TokenBucketLimiter(
+    rate=float(os.getenv('BATCH_PARTNER_RATE_LIMIT_RATE', '10')),
+    burst=float(os.getenv('BATCH_PARTNER_RATE_LIMIT_BURST', str(BATCH_MAX_QUESTIONS))),
+    store=_rate_limit_store,
+)
+
+# Prometheus metrics, exposed on /metrics
+METRICS = Registry()
+REQUEST_LATENCY = METRICS.histogram(
+    'tarot_http_request_duration_seconds', 'Time until response headers are sent, by route.',
+    ('route', 'method', 'status'))
+UPSTREAM_LATENCY = METRICS.histogram(
+    'tarot_upstream_request_duration_seconds', 'Anthropic API call duration (streams: until the last token).',
+    ('call', 'outcome'))
+UPSTREAM_TOKENS = METRICS.counter(
+    'tarot_upstream_tokens_total', 'Tokens reported in message.usage.', ('type',))
+READINGS_SERVED = METRICS.counter(
+    'tarot_readings_total', 'Readings served, by where the text came from.', ('source',))
+FALLBACK_READINGS_SERVED = METRICS.counter(
+    'tarot_fallback_readings_total', 'Template readings served instead of AI ones, by reason.', ('reason',))
+CARD_DRAWS = METRICS.counter(
+    'tarot_card_draws_total', 'Cards drawn, including spread positions.', ('card',))
+METRICS.gauge('tarot_circuit_breaker_open', 'Whether the upstream circuit breaker is open (1) or not (0).',
+              lambda: int(READING_BREAKER.snapshot()['state'] == 'open'))
+METRICS.gauge('tarot_reading_cache_entries', 'Readings held in the in-memory cache.',
+              lambda: READING_CACHE.stats()['size'])
+METRICS.gauge('tarot_rate_limited_requests', 'Requests rejected by the per-client rate limit since start.',
+              lambda: DRAW_RATE_LIMITER.limited)
+METRICS.gauge('tarot_batch_rate_limited_requests', 'Batches rejected by the per-client batch limit since start.',
+              lambda: BATCH_RATE_LIMITER.limited + BATCH_PARTNER_RATE_LIMITER.limited)
+
+def fallback_reason(error):
+    """Metric label for why an upstream call failed: circuit_open, timeout or exception"""
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(error).__name__:
+        return 'timeout'
+    return 'exception'
+
+def record_served(source, details=None, context=None):
+    """Count a served reading; details, when given, records where it came from for the reading store"""
+    READINGS_SERVED.inc(source)
+    if details is not None:
+        details.update(source=source, context=context, model=None if source == 'fallback' else READING_MODEL)
+
+def record_fallback(reason, details=None, context=None):
+    record_served('fallback', details, context)
+    FALLBACK_READINGS_SERVED.inc(reason)
+
+# The deck is data - see cards.json. Card ids match the NN_ prefix of the
+# artwork in major_arcana_cards/, and each card's JSON carries its image URLs
+CARD_REGISTRY = load_card_registry(
+    os.getenv('CARDS_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cards.json')),
+    extra_fields=lambda card: {'image': card_images.image_sources(card.id)},
+)
+CARDS = CARD_REGISTRY.cards
+
+# Question contexts and their keywords are data - see contexts.json
+CONTEXT_CLASSIFIER = load_context_classifier(
+    os.getenv('CONTEXTS_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'contexts.json'))
+)
 
 def determine_context(question):
     """Determine the context of the question"""
-    question_lower = question.lower()
-    
-    love_keywords = ['love', 'relationship', 'romance', 'partner', 'dating', 'marriage', 'heart', 'feelings']
-    career_keywords = ['career', 'job', 'work', 'business', 'money', 'success', 'professional', 'promotion']
-    
-    if any(keyword in question_lower for keyword in love_keywords):
-        return 'love'
-    elif any(keyword in question_lower for keyword in career_keywords):
-        return 'career'
-    else:
-        return 'general'
+    return CONTEXT_CLASSIFIER.classify(question)
 
-def generate_fallback_reading(question, card):
-    """Generate a reading without AI as fallback"""
-    context = determine_context(question)
-    
-    reading_templates = {
+def render_fallback_templates(card):
+    """Render every context's template reading for a card"""
+    return {
         'love': f"""CARD MESSAGE:
-The {card['name']} speaks to matters of the heart with profound wisdom. In your question about love and relationships, this card suggests that {card['meaning'].lower()} will play a crucial role in your romantic journey.
+The {card.name} speaks to matters of the heart with profound wisdom. In your question about love and relationships, this card suggests that {card.meaning.lower()} will play a crucial role in your romantic journey.
 
 HOW THIS RELATES TO YOU:
-The energy of {card['keywords'][0]} and {card['keywords'][1]} is particularly relevant to your current relationship situation. Consider how embracing {card['keywords'][2]} might transform your current relationship dynamics.
+The energy of {card.keywords[0]} and {card.keywords[1]} is particularly relevant to your current relationship situation. Consider how embracing {card.keywords[2]} might transform your current relationship dynamics.
 
 GUIDANCE AND INSIGHTS:
-- Focus on cultivating {card['keywords'][0]} in your romantic connections
-- Allow {card['keywords'][1]} to guide your decisions in matters of the heart  
-- Remember that {card['keywords'][3]} will help you move forward with greater clarity
+- Focus on cultivating {card.keywords[0]} in your romantic connections
+- Allow {card.keywords[1]} to guide your decisions in matters of the heart  
+- Remember that {card.keywords[3]} will help you move forward with greater clarity
 
 MOVING FORWARD:
 Trust in the process and remain open to the lessons this card offers for your romantic growth.
 
 KEY TAKEAWAY:
-Love flourishes when you embrace the energy of {card['keywords'][4]} and trust in your heart's wisdom.""",
+Love flourishes when you embrace the energy of {card.keywords[4]} and trust in your heart's wisdom.""",
         
         'career': f"""CARD MESSAGE:
-In matters of career and professional growth, the {card['name']} offers powerful guidance. This card embodies {card['meaning'].lower()}, suggesting that your professional path requires focus on these qualities.
+In matters of career and professional growth, the {card.name} offers powerful guidance. This card embodies {card.meaning.lower()}, suggesting that your professional path requires focus on these qualities.
 
 HOW THIS RELATES TO YOU:
-Your career question aligns perfectly with the energy of {card['keywords'][0]} and {card['keywords'][1]}. This card's appearance indicates significant opportunities for professional development.
+Your career question aligns perfectly with the energy of {card.keywords[0]} and {card.keywords[1]}. This card's appearance indicates significant opportunities for professional development.
 
 GUIDANCE AND INSIGHTS:
-- Embrace {card['keywords'][0]} as a key to unlocking career opportunities
-- Use {card['keywords'][1]} to navigate workplace challenges with confidence
-- Focus on developing {card['keywords'][2]} to advance your professional goals
+- Embrace {card.keywords[0]} as a key to unlocking career opportunities
+- Use {card.keywords[1]} to navigate workplace challenges with confidence
+- Focus on developing {card.keywords[2]} to advance your professional goals
 
 MOVING FORWARD:
 Trust in the process and remain open to new opportunities that align with your authentic professional self.
 
 KEY TAKEAWAY:
-Your career success depends on incorporating {card['keywords'][4]} into your professional approach.""",
+Your career success depends on incorporating {card.keywords[4]} into your professional approach.""",
         
         'general': f"""CARD MESSAGE:
-The {card['name']} emerges to guide you through your current situation. This powerful card represents {card['meaning'].lower()}, offering insights that directly relate to your inquiry.
+The {card.name} emerges to guide you through your current situation. This powerful card represents {card.meaning.lower()}, offering insights that directly relate to your inquiry.
 
 HOW THIS RELATES TO YOU:
-The cosmic forces have aligned to bring you energies of {card['keywords'][0]} and {card['keywords'][1]}. These themes are particularly relevant to your current life circumstances.
+The cosmic forces have aligned to bring you energies of {card.keywords[0]} and {card.keywords[1]}. These themes are particularly relevant to your current life circumstances.
 
 GUIDANCE AND INSIGHTS:
-- Embrace the quality of {card['keywords'][0]} to navigate your current challenges
-- Allow {card['keywords'][1]} to inform your decisions and actions
-- Trust that {card['keywords'][2]} will guide you toward the right path
+- Embrace the quality of {card.keywords[0]} to navigate your current challenges
+- Allow {card.keywords[1]} to inform your decisions and actions
+- Trust that {card.keywords[2]} will guide you toward the right path
 
 MOVING FORWARD:
 Focus on integrating these insights into your daily life and trust in your inner wisdom.
 
 KEY TAKEAWAY:
-You have the power to shape your destiny by embracing {card['keywords'][4]} and trusting in your authentic self."""
+You have the power to shape your destiny by embracing {card.keywords[4]} and trusting in your authentic self."""
     }
-    
-    return reading_templates.get(context, reading_templates['general'])
 
-def generate_ai_reading(question, card):
-    """Generate a personalized tarot reading using Anthropic's Claude"""
-    
-    # Check if API is available and configured
-    if not ANTHROPIC_AVAILABLE or not ANTHROPIC_API_KEY:
-        print("🔄 Using fallback reading (no AI)")
-        return generate_fallback_reading(question, card)
+# Fallback readings only depend on (card, template), so render them all once
+FALLBACK_READINGS = {
+    (card.name, template): reading
+    for card in CARDS
+    for template, reading in render_fallback_templates(card).items()
+}
+
+def generate_fallback_reading(question, card):
+    """Generate a reading without AI as fallback"""
+    template = CONTEXT_CLASSIFIER.template_for(determine_context(question))
     
-    prompt = f"""You are an experienced, wise tarot reader. A person has drawn the tarot card "{card['name']}" and shared: "{question}"
+    reading = FALLBACK_READINGS.get((card.name, template)) or FALLBACK_READINGS.get((card.name, 'general'))
+    if reading is None:
+        # Card outside the deck table - render it directly
+        reading_templates = render_fallback_templates(card)
+        reading = reading_templates.get(template, reading_templates['general'])
+    return reading
 
-The card represents: {card['meaning']}
-Key themes: {', '.join(card['keywords'])}
+READING_MODEL = "claude-3-5-sonnet-20241022"
+READING_MAX_TOKENS = 500
+
+def ai_readings_enabled():
+    """True when readings can be generated by Claude"""
+    return bool(ANTHROPIC_AVAILABLE and ANTHROPIC_API_KEY)
+
+# Prompt caching was a beta feature in this SDK version; the header is harmless once GA
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+CACHE_BREAKPOINT = {"type": "ephemeral"}
+
+# Stable prefix shared by every reading - cached upstream
+READING_SYSTEM_PROMPT = """You are an experienced, wise tarot reader. A person has drawn a tarot card and shared a question along with the context of their situation.
 
 Please provide a structured tarot reading using this exact format (use EXACTLY these section headers):
 
@@ -184,28 +346,346 @@ KEY TAKEAWAY:
 
 Use a warm, wise, and empowering tone. Make each section meaningful and specific to their situation."""
 
+def build_card_block(card):
+    """Per-card part of the prompt - one of 22, cached upstream after the system prefix"""
+    return f"""The person has drawn the tarot card "{card.name}".
+
+The card represents: {card.meaning}
+Key themes: {', '.join(card.keywords)}"""
+
+def build_question_block(question, context):
+    block = f'They shared: "{question}"'
+    if context != CONTEXT_CLASSIFIER.default:
+        block += f"\n\nTheir question appears to be mainly about: {context}"
+    return block
+
+def build_reading_prompt(question, card, context=None):
+    """Build the per-request prompt parts: the card block and the question"""
+    if context is None:
+        context = determine_context(question)
+    return (build_card_block(card), build_question_block(question, context))
+
+def build_reading_request(prompt):
+    """Keyword arguments for a messages.create/stream reading call"""
+    card_block, question_block = prompt
+    return {
+        'model': READING_MODEL,
+        'max_tokens': READING_MAX_TOKENS,
+        'system': [
+            {"type": "text", "text": READING_SYSTEM_PROMPT, "cache_control": CACHE_BREAKPOINT}
+        ],
+        'messages': [
+            {"role": "user", "content": [
+                {"type": "text", "text": card_block, "cache_control": CACHE_BREAKPOINT},
+                {"type": "text", "text": question_block},
+            ]}
+        ],
+        'extra_headers': PROMPT_CACHING_HEADERS,
+        'timeout': READING_LATENCY_BUDGET,
+    }
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+UPSTREAM_USAGE = dict.fromkeys(('calls',) + USAGE_FIELDS, 0)
+_usage_lock = threading.Lock()
+
+def record_usage(usage):
+    """Add one response's token usage, including prompt-cache reads/writes"""
+    with _usage_lock:
+        UPSTREAM_USAGE['calls'] += 1
+        for field in USAGE_FIELDS:
+            UPSTREAM_USAGE[field] += getattr(usage, field, None) or 0
+    for field in USAGE_FIELDS:
+        tokens = getattr(usage, field, None)
+        if tokens:
+            UPSTREAM_TOKENS.inc(field[:-len('_tokens')], amount=tokens)
+
+def build_spread_request(spread_block, question_block, max_tokens):
+    """Keyword arguments for a whole-spread reading call"""
+    return {
+        'model': READING_MODEL,
+        'max_tokens': max_tokens,
+        'system': [
+            {"type": "text", "text": SPREAD_SYSTEM_PROMPT, "cache_control": CACHE_BREAKPOINT}
+        ],
+        'messages': [
+            {"role": "user", "content": [
+                {"type": "text", "text": spread_block},
+                {"type": "text", "text": question_block},
+            ]}
+        ],
+        'extra_headers': PROMPT_CACHING_HEADERS,
+        # Longer outputs get a proportionally longer budget
+        'timeout': READING_LATENCY_BUDGET * max(1, max_tokens / READING_MAX_TOKENS),
+    }
+
+# Raised before any upstream call is made - not the upstream's failure
+NOT_CALLED = (SlotTimeout, CircuitOpenError)
+
+def _check_breaker():
+    # The breaker may have opened while this request queued for a slot
+    if not READING_BREAKER.allow_request():
+        raise CircuitOpenError("circuit opened while waiting for an upstream slot")
+
+@contextlib.contextmanager
+def upstream_slot(budget):
+    """Hold an upstream slot; yields the seconds of budget left once it is held
+
+    Queueing for a slot counts against the budget, and the breaker is asked
+    again once the slot is held.
+    """
+    deadline = time.monotonic() + budget
+    if not _upstream_slots.acquire(timeout=budget):
+        raise SlotTimeout(f"no upstream slot free within {budget:g}s")
+    try:
+        _check_breaker()
+        yield max(0.0, deadline - time.monotonic())
+    finally:
+        _upstream_slots.release()
+
+@contextlib.asynccontextmanager
+async def upstream_slot_async(budget):
+    deadline = time.monotonic() + budget
+    if not await _upstream_slots.acquire_async(timeout=budget):
+        raise SlotTimeout(f"no upstream slot free within {budget:g}s")
     try:
-        print(f"🤖 Generating AI reading for: {card['name']}")
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=500,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        print("✅ AI reading generated successfully")
-        return message.content[0].text
+        _check_breaker()
+        yield max(0.0, deadline - time.monotonic())
+    finally:
+        _upstream_slots.release()
+
+def _create_reading(request):
+    """One upstream messages.create call within request['timeout'], reported to the circuit breaker"""
+    with upstream_slot(request['timeout']) as remaining:
+        started = time.perf_counter()
+        try:
+            message = get_client().messages.create(**dict(request, timeout=remaining))
+        except Exception as e:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'create', fallback_reason(e))
+            READING_BREAKER.record_failure()
+            raise
+    UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'create', 'ok')
+    READING_BREAKER.record_success()
+    record_usage(message.usage)
+    return message.content[0].text
+
+async def _create_reading_async(request):
+    async with upstream_slot_async(request['timeout']) as remaining:
+        started = time.perf_counter()
+        try:
+            message = await asyncio.wait_for(
+                get_async_client().messages.create(**dict(request, timeout=remaining)),
+                remaining,
+            )
+        except Exception as e:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'create', fallback_reason(e))
+            READING_BREAKER.record_failure()
+            raise
+    UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'create', 'ok')
+    READING_BREAKER.record_success()
+    record_usage(message.usage)
+    return message.content[0].text
+
+def reading_cache_key(question, card, context):
+    """Cache key: card, question context and the normalized question"""
+    return (card.name, context, normalize_question(question))
+
+def serve_fallback_reading(question, card, reason, details=None, context=None):
+    """Template reading in place of an AI one, counted under reason"""
+    record_fallback(reason, details, context)
+    with span('fallback_reading', reason=reason):
+        return generate_fallback_reading(question, card)
+
+def prepare_reading(question, card, use_cache=True, details=None):
+    """Everything before the upstream call, shared by the plain, streamed and async readings
+
+    Returns (reading, None) when no call is needed - a cached reading, or a
+    template one when there is no key or the circuit is open - otherwise
+    (None, (context, cache_key, prompt)).
+    """
+    if not ai_readings_enabled():
+        log.info("🔄 Using fallback reading (no AI)")
+        return serve_fallback_reading(question, card, 'no_key', details), None
+    
+    with span('determine_context') as attributes:
+        context = attributes['context'] = determine_context(question)
+    cache_key = reading_cache_key(question, card, context)
+    if use_cache:
+        with span('cache_lookup') as attributes:
+            cached = READING_CACHE.get(cache_key)
+            attributes['hit'] = cached is not None
+        if cached is not None:
+            log.info(f"⚡ Cached reading for: {card.name}")
+            record_served('cache', details, context)
+            return cached, None
+    
+    if not READING_BREAKER.allow_request(claim_probe=False):
+        log.info("⚡ Circuit open - using fallback reading")
+        return serve_fallback_reading(question, card, 'circuit_open', details, context), None
+    
+    with span('build_prompt'):
+        prompt = build_reading_prompt(question, card, context)
+    return None, (context, cache_key, prompt)
+
+def generate_ai_reading(question, card, use_cache=True, details=None):
+    """Generate a personalized tarot reading using Anthropic's Claude"""
+    reading, upstream = prepare_reading(question, card, use_cache, details)
+    if upstream is None:
+        return reading
+    context, cache_key, prompt = upstream
+
+    try:
+        log.info(f"🤖 Generating AI reading for: {card.name}")
+        with span('upstream', card=card.name):
+            reading = _inflight_readings.do(prompt, lambda: _create_reading(build_reading_request(prompt)))
+        log.info("✅ AI reading generated successfully")
+        record_served('ai', details, context)
+        READING_CACHE.set(cache_key, reading)
+        return reading
         
     except Exception as e:
-        print(f"❌ Error generating AI reading: {e}")
-        print(f"Error type: {type(e).__name__}")
-        print("🔄 Falling back to template reading")
-        return generate_fallback_reading(question, card)
+        log.error(f"❌ Error generating AI reading: {type(e).__name__}: {e}")
+        log.info("🔄 Falling back to template reading")
+        return serve_fallback_reading(question, card, fallback_reason(e), details, context)
 
-@app.route("/")
-def home():
-    api_status = "🤖 AI-powered readings" if (ANTHROPIC_AVAILABLE and ANTHROPIC_API_KEY) else "📖 Template readings"
+async def generate_ai_reading_async(question, card, use_cache=True, details=None):
+    """Async variant of generate_ai_reading for the ASGI entry point"""
+    reading, upstream = prepare_reading(question, card, use_cache, details)
+    if upstream is None:
+        return reading
+    context, cache_key, prompt = upstream
+
+    try:
+        log.info(f"🤖 Generating AI reading for: {card.name}")
+        with span('upstream', card=card.name):
+            reading = await _async_inflight_readings.do(prompt, lambda: _create_reading_async(build_reading_request(prompt)))
+        log.info("✅ AI reading generated successfully")
+        record_served('ai', details, context)
+        READING_CACHE.set(cache_key, reading)
+        return reading
+        
+    except Exception as e:
+        log.error(f"❌ Error generating AI reading: {type(e).__name__}: {e}")
+        log.info("🔄 Falling back to template reading")
+        return serve_fallback_reading(question, card, fallback_reason(e), details, context)
+
+def stream_ai_reading(question, card, use_cache=True, details=None):
+    """Yield reading text as it arrives from Claude's streaming API"""
+    reading, upstream = prepare_reading(question, card, use_cache, details)
+    if upstream is None:
+        yield from reading.splitlines(keepends=True)
+        return
+    context, cache_key, prompt = upstream
+    chunks = []
+
+    try:
+        log.info(f"🤖 Streaming AI reading for: {card.name}")
+        with upstream_slot(READING_LATENCY_BUDGET):
+            started = time.perf_counter()
+            with get_client().messages.stream(**build_reading_request(prompt)) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                record_usage(stream.get_final_message().usage)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'stream', 'ok')
+        READING_BREAKER.record_success()
+        log.info("✅ AI reading streamed successfully")
+        record_served('ai', details, context)
+        READING_CACHE.set(cache_key, ''.join(chunks))
+
+    except Exception as e:
+        if not isinstance(e, NOT_CALLED):
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'stream', fallback_reason(e))
+            READING_BREAKER.record_failure()
+        log.error(f"❌ Error streaming AI reading: {e}")
+        # Once text has reached the client we can't swap in a template
+        if chunks:
+            raise
+        log.info("🔄 Falling back to template reading")
+        yield from serve_fallback_reading(question, card, fallback_reason(e), details, context).splitlines(keepends=True)
+
+async def stream_ai_reading_async(question, card, use_cache=True, details=None):
+    """Async variant of stream_ai_reading for the ASGI entry point"""
+    reading, upstream = prepare_reading(question, card, use_cache, details)
+    if upstream is None:
+        for line in reading.splitlines(keepends=True):
+            yield line
+        return
+    context, cache_key, prompt = upstream
+    chunks = []
+
+    try:
+        log.info(f"🤖 Streaming AI reading for: {card.name}")
+        async with upstream_slot_async(READING_LATENCY_BUDGET):
+            started = time.perf_counter()
+            async with get_async_client().messages.stream(**build_reading_request(prompt)) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                record_usage((await stream.get_final_message()).usage)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'stream', 'ok')
+        READING_BREAKER.record_success()
+        log.info("✅ AI reading streamed successfully")
+        record_served('ai', details, context)
+        READING_CACHE.set(cache_key, ''.join(chunks))
+
+    except Exception as e:
+        if not isinstance(e, NOT_CALLED):
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, 'stream', fallback_reason(e))
+            READING_BREAKER.record_failure()
+        log.error(f"❌ Error streaming AI reading: {e}")
+        if chunks:
+            raise
+        log.info("🔄 Falling back to template reading")
+        for line in serve_fallback_reading(question, card, fallback_reason(e), details, context).splitlines(keepends=True):
+            yield line
+
+SPREAD_TOKENS_PER_CARD = 150
+
+def generate_spread_reading(question, spread_id, drawn, use_cache=True, details=None):
+    """Interpret a whole spread with one upstream call; returns the raw reading text"""
+    
+    if not ai_readings_enabled():
+        log.info("🔄 Using fallback spread reading (no AI)")
+        record_fallback('no_key', details)
+        return generate_fallback_spread_reading(drawn)
+    
+    context = determine_context(question)
+    cache_key = (spread_id, tuple(slot['card'].name for slot in drawn), context, normalize_question(question))
+    if use_cache:
+        cached = READING_CACHE.get(cache_key)
+        if cached is not None:
+            log.info(f"⚡ Cached spread reading: {spread_id}")
+            record_served('cache', details, context)
+            return cached
     
+    if not READING_BREAKER.allow_request(claim_probe=False):
+        log.info("⚡ Circuit open - using fallback spread reading")
+        record_fallback('circuit_open', details, context)
+        return generate_fallback_spread_reading(drawn)
+    
+    prompt = (build_spread_block(spread_id, drawn), build_question_block(question, context))
+    max_tokens = READING_MAX_TOKENS + SPREAD_TOKENS_PER_CARD * len(drawn)
+
+    try:
+        log.info(f"🤖 Generating AI spread reading: {spread_id} ({len(drawn)} cards)")
+        reading = _inflight_readings.do(prompt, lambda: _create_reading(build_spread_request(*prompt, max_tokens)))
+        log.info("✅ AI spread reading generated successfully")
+        record_served('ai', details, context)
+        READING_CACHE.set(cache_key, reading)
+        return reading
+        
+    except Exception as e:
+        log.error(f"❌ Error generating AI spread reading: {e}")
+        log.info("🔄 Falling back to template spread reading")
+        record_fallback(fallback_reason(e), details, context)
+        return generate_fallback_spread_reading(drawn)
+
+def get_api_status():
+    """Label shown on the home page for the current reading mode"""
+    return "🤖 AI-powered readings" if ai_readings_enabled() else "📖 Template readings"
+
+def render_home_page(api_status):
+    """Render the full home page HTML for a given status label"""
     return f"""
 <!DOCTYPE html>
 <html>
@@ -462,6 +942,15 @@ def home():
             color: #6B73FF;
             margin-bottom: 20px;
         }}
+        .card-image img {{
+            display: block;
+            width: 100%;
+            max-width: 240px;
+            height: auto;
+            margin: 0 auto 20px;
+            border-radius: 10px;
+            box-shadow: 0 8px 20px rgba(107, 115, 255, 0.2);
+        }}
         .card-meaning {{
             font-size: 1.1em;
             color: #64748B;
@@ -575,6 +1064,7 @@ def home():
         <div id="cardResult" class="card-result">
             <div class="card-name" id="cardName"></div>
             <div class="symbol" id="cardSymbol"></div>
+            <picture class="card-image" id="cardImage"></picture>
             <div class="card-meaning" id="cardMeaning"></div>
             
             <div class="reading">
@@ -595,10 +1085,92 @@ def home():
             charCount.textContent = textarea.value.length;
         }}
 
+        function formatReading(reading) {{
+            // Simple formatting that actually works
+            let formattedReading = reading;
+
+            // Format section headers
+            formattedReading = formattedReading.replace(/CARD MESSAGE:/g, '<h4>💫 Card Message:</h4>');
+            formattedReading = formattedReading.replace(/HOW THIS RELATES TO YOU:/g, '<h4>🔍 How This Relates to You:</h4>');
+            formattedReading = formattedReading.replace(/GUIDANCE AND INSIGHTS:/g, '<h4>✨ Guidance & Insights:</h4>');
+            formattedReading = formattedReading.replace(/MOVING FORWARD:/g, '<h4>🚀 Moving Forward:</h4>');
+            formattedReading = formattedReading.replace(/KEY TAKEAWAY:/g, '<h4>🌟 Key Takeaway:</h4>');
+
+            // Convert bullet points that start with -
+            formattedReading = formattedReading.replace(/^- (.+)$/gm, '<li>$1</li>');
+
+            // Simple list wrapping
+            formattedReading = formattedReading.replace(/(<li>.*?<\\/li>)/gs, '<ul>$1</ul>');
+
+            // Convert line breaks to paragraphs
+            formattedReading = formattedReading.replace(/\\n\\n/g, '</p><p>');
+            formattedReading = formattedReading.replace(/\\n/g, '<br>');
+
+            // Wrap in paragraphs if needed
+            if (!formattedReading.includes('<p>')) {{
+                formattedReading = '<p>' + formattedReading + '</p>';
+            }}
+
+            return formattedReading;
+        }}
+
+        // Parse a Server-Sent Events body, calling onEvent(event, data) per message
+        async function readEventStream(response, onEvent) {{
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {{
+                const {{ done, value }} = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, {{ stream: true }});
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {{
+                    const message = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let event = 'message';
+                    let data = '';
+                    for (const line of message.split('\\n')) {{
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    }}
+                    onEvent(event, JSON.parse(data));
+                }}
+            }}
+        }}
+
+        function renderCardImage(card) {{
+            // Best format the browser supports, at the width the layout needs
+            const picture = document.getElementById('cardImage');
+            picture.replaceChildren();
+            if (!card.image) return;
+            const sizes = '(max-width: 600px) 60vw, 240px';
+            for (const [format, srcset] of Object.entries(card.image.srcset)) {{
+                if (format === 'png') continue;
+                const source = document.createElement('source');
+                source.type = 'image/' + format;
+                source.srcset = srcset;
+                source.sizes = sizes;
+                picture.appendChild(source);
+            }}
+            const img = document.createElement('img');
+            img.src = card.image.src;
+            if (card.image.srcset.png) {{
+                img.srcset = card.image.srcset.png;
+                img.sizes = sizes;
+            }}
+            img.alt = card.name;
+            img.decoding = 'async';
+            picture.appendChild(img);
+        }}
+
         async function drawCard() {{
             const question = document.getElementById('question').value.trim();
             const drawBtn = document.getElementById('drawBtn');
             const cardResult = document.getElementById('cardResult');
+            const readingText = document.getElementById('readingText');
             
             if (!question) {{
                 alert('Please enter your question first!');
@@ -616,58 +1188,59 @@ def home():
             cardResult.classList.remove('show');
             
             try {{
-                const response = await fetch('/draw-card', {{
+                const response = await fetch('/draw-card/stream', {{
                     method: 'POST',
                     headers: {{
                         'Content-Type': 'application/json',
+                        'Accept': 'text/event-stream',
                     }},
                     body: JSON.stringify({{ question: question }})
                 }});
                 
-                const data = await response.json();
-                
-                if (data.error) {{
+                if (!response.ok) {{
+                    const data = await response.json();
                     alert('Error: ' + data.error);
                     return;
                 }}
                 
-                // Update card display
-                document.getElementById('cardName').textContent = data.card.name;
-                document.getElementById('cardSymbol').textContent = data.card.symbol;
-                document.getElementById('cardMeaning').textContent = data.card.meaning;
-                
-                // Simple formatting that actually works
-                let formattedReading = data.reading;
-
-                // Format section headers
-                formattedReading = formattedReading.replace(/CARD MESSAGE:/g, '<h4>💫 Card Message:</h4>');
-                formattedReading = formattedReading.replace(/HOW THIS RELATES TO YOU:/g, '<h4>🔍 How This Relates to You:</h4>');
-                formattedReading = formattedReading.replace(/GUIDANCE AND INSIGHTS:/g, '<h4>✨ Guidance & Insights:</h4>');
-                formattedReading = formattedReading.replace(/MOVING FORWARD:/g, '<h4>🚀 Moving Forward:</h4>');
-                formattedReading = formattedReading.replace(/KEY TAKEAWAY:/g, '<h4>🌟 Key Takeaway:</h4>');
-
-                // Convert bullet points that start with -
-                formattedReading = formattedReading.replace(/^- (.+)$/gm, '<li>$1</li>');
-
-                // Simple list wrapping
-                formattedReading = formattedReading.replace(/(<li>.*?<\\/li>)/gs, '<ul>$1</ul>');
-
-                // Convert line breaks to paragraphs
-                formattedReading = formattedReading.replace(/\\n\\n/g, '</p><p>');
-                formattedReading = formattedReading.replace(/\\n/g, '<br>');
-
-                // Wrap in paragraphs if needed
-                if (!formattedReading.includes('<p>')) {{
-                    formattedReading = '<p>' + formattedReading + '</p>';
-                }}
-
-                document.getElementById('readingText').innerHTML = formattedReading;
+                // Re-render at most once per frame while text streams in
+                let reading = '';
+                let renderPending = false;
+                let streamError = null;
+                const render = () => {{
+                    renderPending = false;
+                    readingText.innerHTML = formatReading(reading);
+                }};
                 
-                // Show result
-                cardResult.classList.add('show');
+                await readEventStream(response, (event, data) => {{
+                    if (event === 'card') {{
+                        // Update card display as soon as it is drawn
+                        document.getElementById('cardName').textContent = data.name;
+                        document.getElementById('cardSymbol').textContent = data.symbol;
+                        document.getElementById('cardMeaning').textContent = data.meaning;
+                        renderCardImage(data);
+                        readingText.innerHTML = '<p class="loading"><span class="spinner"></span>The cards are speaking...</p>';
+                        
+                        // Show result
+                        cardResult.classList.add('show');
+                        
+                        // Scroll to result
+                        cardResult.scrollIntoView({{ behavior: 'smooth', block: 'start' }});
+                    }} else if (event === 'reading') {{
+                        reading += data.text;
+                        if (!renderPending) {{
+                            renderPending = true;
+                            requestAnimationFrame(render);
+                        }}
+                    }} else if (event === 'error') {{
+                        streamError = data.error;
+                    }}
+                }});
                 
-                // Scroll to result
-                cardResult.scrollIntoView({{ behavior: 'smooth', block: 'start' }});
+                render();
+                if (streamError) {{
+                    alert('Error: ' + streamError);
+                }}
                 
             }} catch (error) {{
                 alert('Something went wrong. Please try again.');
@@ -727,29 +1300,450 @@ def home():
 </html>
 """
 
-@app.route('/draw-card', methods=['POST'])
-def draw_card():
+class PrerenderedPage:
+    """Rendered page bytes with precompressed variants and their ETags"""
+
+    def __init__(self, html):
+        body = html.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': (body, digest)}
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f"{digest}-gz")
+        if BROTLI_AVAILABLE:
+            self.variants['br'] = (brotli.compress(body, mode=brotli.MODE_TEXT, quality=11), f"{digest}-br")
+
+    def select(self, accept_encodings):
+        """Pick the smallest variant the client accepts"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    g.trace = begin_trace(f"{request.method} {request.path}",
+                          request_id_from(request.headers.get(REQUEST_ID_HEADER)))
+
+@app.after_request
+def record_request_latency(response):
+    """Time to response headers; streamed bodies are still being written after this"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers[REQUEST_ID_HEADER] = trace.trace_id
+        trace.attributes['status'] = response.status_code
+        if response.status_code >= 500:
+            trace.error = f"HTTP {response.status_code}"
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    # Streamed responses tear down once the body is done, so their traces cover it
+    trace = g.pop('trace', None)
+    if trace is not None:
+        end_trace(trace, error)
+
+_home_pages = {}
+_home_pages_lock = threading.Lock()
+
+def get_home_page():
+    """Return the prerendered home page, rendering only when the status changes"""
+    api_status = get_api_status()
+    page = _home_pages.get(api_status)
+    if page is None:
+        with _home_pages_lock:
+            page = _home_pages.get(api_status)
+            if page is None:
+                page = PrerenderedPage(render_home_page(api_status))
+                _home_pages.clear()
+                _home_pages[api_status] = page
+    return page
+
+@app.route("/")
+def home():
+    page = get_home_page()
+    encoding = page.select(request.accept_encodings)
+    body, etag = page.variants[encoding]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/status')
+def status():
+    """Operational snapshot: reading mode, circuit breaker, cache and upstream usage"""
+    with _usage_lock:
+        usage = dict(UPSTREAM_USAGE)
+    return jsonify({
+        'ai_readings': ai_readings_enabled(),
+        'latency_budget_seconds': READING_LATENCY_BUDGET,
+        'max_upstream_concurrency': UPSTREAM_MAX_CONCURRENCY,
+        'circuit_breaker': READING_BREAKER.snapshot(),
+        'reading_cache': READING_CACHE.stats(),
+        'reading_store': READING_STORE.stats(),
+        'rate_limit': {'rate': DRAW_RATE_LIMITER.rate, 'burst': DRAW_RATE_LIMITER.burst, 'limited': DRAW_RATE_LIMITER.limited},
+        'batch_rate_limit': {
+            'rate': BATCH_RATE_LIMITER.rate, 'burst': BATCH_RATE_LIMITER.burst,
+            'partner_rate': BATCH_PARTNER_RATE_LIMITER.rate, 'partner_burst': BATCH_PARTNER_RATE_LIMITER.burst,
+            'limited': BATCH_RATE_LIMITER.limited + BATCH_PARTNER_RATE_LIMITER.limited,
+        },
+        'upstream_usage': usage,
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(METRICS.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+_READING_ID = re.compile(r'^[A-Za-z0-9_-]{16}$')
+
+def render_stored_reading(record):
+    """Response body and ETag for a stored reading, in the shape its route returned"""
+    cards = [CARD_REGISTRY.by_id[card_id] for card_id in record['cards']]
+    payload = {'id': record['id'], 'created': record['created'], 'context': record['context']}
+    if record['spread']:
+        positions = SPREADS[record['spread']]['positions']
+        drawn = [{'position': name, 'description': description, 'card': card}
+                 for (name, description), card in zip(positions, cards)]
+        payload.update(spread=record['spread'], cards=drawn, reading=record['reading'],
+                       sections=parse_spread_reading(record['reading'], drawn))
+    else:
+        payload.update(card=cards[0], reading=record['reading'])
+    body = json.dumps(payload, default=json_default).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:16]
+
+@app.route('/readings/<reading_id>')
+def shared_reading(reading_id):
+    """A stored reading by ID - one indexed lookup on a cache miss, never a model call"""
+    cached = SHARED_READING_CACHE.get(reading_id)
+    if cached is None:
+        try:
+            record = READING_STORE.get(reading_id) if _READING_ID.match(reading_id) else None
+        except sqlite3.Error as e:
+            log.error(f"❌ Could not look up reading {reading_id}: {e}")
+            return jsonify({'error': 'Shared readings are unavailable right now. Please try again later.'}), 503
+        if record is None:
+            return jsonify({'error': 'Reading not found.'}), 404
+        cached = render_stored_reading(record)
+        SHARED_READING_CACHE.set(reading_id, cached)
+
+    body, etag = cached
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@app.route('/cards')
+def card_catalog():
+    """The whole deck, serialized once at startup; revalidated by ETag"""
+    if request.if_none_match.contains(CARD_REGISTRY.catalog_etag):
+        response = Response(status=304)
+    else:
+        response = Response(CARD_REGISTRY.catalog_bytes, mimetype='application/json')
+    response.set_etag(CARD_REGISTRY.catalog_etag)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@app.route('/cards/<int:card_id>/image')
+def card_image(card_id):
+    """Card artwork resized to ?w= in ?fmt= (avif/webp/png, else negotiated from Accept)"""
+    if card_id not in card_images.MASTERS:
+        return jsonify({'error': 'Unknown card.'}), 404
+
+    width = card_images.snap_width(request.args.get('w', card_images.DEFAULT_WIDTH, type=int))
+    fmt = request.args.get('fmt')
+    negotiated = fmt not in card_images.supported_formats()
+    if negotiated:
+        fmt = card_images.negotiate_format(request.accept_mimetypes)
+
+    try:
+        path = card_images.get_derivative(card_id, width, fmt)
+    except Exception as e:
+        log.error(f"❌ Error building card image: {e}")
+        path = card_images.MASTERS[card_id][0]
+    response = send_file(path, mimetype=card_images.MIMETYPES[os.path.splitext(path)[1][1:]],
+                         etag=True, conditional=True)
+
+    # Hashed URLs never change content; anything else may after a redeploy
+    if request.args.get('v') == card_images.master_hash(card_id) and path != card_images.MASTERS[card_id][0]:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    # Missing or unsupported ?fmt= - the Accept header picked the format
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+def draw_random_card():
+    """Draw one card from the deck"""
+    card = random.choice(CARDS)
+    log.info(f"🎴 Card drawn: {card.name}")
+    CARD_DRAWS.inc(card.name)
+    return card
+
+def format_sse(event, payload):
+    """Format one Server-Sent Events message with a JSON payload"""
+    return format_sse_json(event, json.dumps(payload))
+
+def format_sse_json(event, data):
+    """Format one Server-Sent Events message from already serialized JSON"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+def reading_json_bytes(card, reading, reading_id=None):
+    """/draw-card body: the card's precomputed JSON spliced in, only the reading encoded"""
+    body = b'{"card":' + card.json_bytes + b',"reading":' + json.dumps(reading).encode('utf-8')
+    if reading_id is not None:
+        body += b',"reading_id":"' + reading_id.encode('ascii') + b'"'
+    return body + b'}'
+
+def question_hash(question):
+    """Stored instead of the question itself"""
+    return hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()[:32]
+
+def store_reading(cards, reading, question, details, started, spread=None):
+    """Queue a served reading for the store (no disk I/O here); returns its shareable ID"""
+    return READING_STORE.save(
+        [card.id for card in cards], reading, spread=spread,
+        context=details.get('context') or determine_context(question), question_hash=question_hash(question),
+        source=details.get('source'), model=details.get('model'),
+        duration_ms=(time.perf_counter() - started) * 1000,
+    )
+
+def stream_reading_events(question, card, use_cache=True):
+    """Yield SSE messages: the drawn card first, then the reading as it arrives, then its ID"""
+    started = time.perf_counter()
+    yield format_sse_json('card', card.json_text)
+    try:
+        details, chunks = {}, []
+        for text in stream_ai_reading(question, card, use_cache, details):
+            chunks.append(text)
+            yield format_sse('reading', {'text': text})
+        reading_id = store_reading([card], ''.join(chunks), question, details, started)
+        yield format_sse('done', {'reading_id': reading_id} if reading_id else {})
+    except Exception as e:
+        log.error(f"❌ Error in reading stream: {e}")
+        yield format_sse('error', {'error': 'Something went wrong. Please try again.'})
+
+def wants_event_stream():
+    """True when the client negotiated a streamed response"""
+    return request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream'
+
+def api_key_identity(api_key):
+    """Bucket key for an allow-listed API key, else None
+
+    Unknown keys must not get a bucket of their own - a fresh key per
+    request would dodge the limit and flood the bucket store.
+    """
+    if not api_key or not RATE_LIMIT_API_KEYS:
+        return None
+    digest = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+    return 'key:' + digest if digest in RATE_LIMIT_API_KEYS else None
+
+def client_address(remote_addr, forwarded_for):
+    """Client IP as the outermost trusted proxy saw it - the RATE_LIMIT_PROXY_HOPS-th X-Forwarded-For
+    entry from the right; with fewer entries than hops, the socket address"""
+    if RATE_LIMIT_PROXY_HOPS and forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(',')]
+        if len(entries) >= RATE_LIMIT_PROXY_HOPS:
+            return entries[-RATE_LIMIT_PROXY_HOPS]
+    return remote_addr
+
+def rate_limit_key():
+    """Clients are identified by an allow-listed API key header, else by IP"""
+    identity = api_key_identity(request.headers.get('X-API-Key'))
+    if identity:
+        return identity
+    forwarded_for = ','.join(request.headers.getlist('X-Forwarded-For'))
+    return f"ip:{client_address(request.remote_addr, forwarded_for)}"
+
+def rate_limit_response(cost=1, limiter=DRAW_RATE_LIMITER, key=None):
+    """Charge the client cost tokens; returns a 429 response if it can't pay, else None"""
+    key = key or rate_limit_key()
+    allowed, retry_after = limiter.check(key, cost)
+    if allowed:
+        return None
+    log.warning(f"🚦 Rate limited: {key} (cost {cost})")
+    response = jsonify({'error': 'Too many readings requested. Please wait a moment and try again.'})
+    response.status_code = 429
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+def batch_rate_limiter(key):
+    """The batch bucket for a rate-limit key - partners get their own, bigger one"""
+    return BATCH_PARTNER_RATE_LIMITER if key.startswith('key:') else BATCH_RATE_LIMITER
+
+def rate_limited(view):
+    """Reject requests over the client's token-bucket limit with 429 + Retry-After"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return rate_limit_response() or view(*args, **kwargs)
+    return wrapper
+
+def _draw_card_stream():
     try:
         data = request.get_json()
         question = data.get('question', '').strip()
         
+        if not question:
+            return jsonify({'error': 'Please enter your question first!'}), 400
+        
+        card = draw_random_card()
+        
+        use_cache = data.get('cache', True) is not False
+        response = Response(stream_with_context(stream_reading_events(question, card, use_cache)),
+                            mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+        
+    except Exception as e:
+        log.error(f"❌ Error in draw_card_stream route: {e}")
+        return jsonify({'error': 'Something went wrong. Please try again.'}), 500
+
+@app.route('/draw-card/stream', methods=['POST'])
+@rate_limited
+def draw_card_stream():
+    return _draw_card_stream()
+
+@app.route('/draw-card', methods=['POST'])
+@rate_limited
+def draw_card():
+    if wants_event_stream():
+        return _draw_card_stream()
+
+    try:
+        with span('parse_request'):
+            data = request.get_json()
+            question = data.get('question', '').strip()
+        
         if not question:
             return jsonify({'error': 'Please enter your question first!'}), 400
         
         # Select random card
-        card = random.choice(CARDS)
-        print(f"🎴 Card drawn: {card['name']}")
+        with span('draw_card'):
+            card = draw_random_card()
         
         # Generate reading
-        reading = generate_ai_reading(question, card)
+        started = time.perf_counter()
+        details = {}
+        with span('generate_reading'):
+            reading = generate_ai_reading(question, card, data.get('cache', True) is not False, details)
+        reading_id = store_reading([card], reading, question, details, started)
+        
+        with span('serialize'):
+            return Response(reading_json_bytes(card, reading, reading_id), mimetype='application/json')
+        
+    except Exception as e:
+        log.error(f"❌ Error in draw_card route: {e}")
+        return jsonify({'error': 'Something went wrong. Please try again.'}), 500
+
+def stream_batch_readings(questions, use_cache=True):
+    """Yield one NDJSON line per question, in completion order"""
+    futures = {}
+    for index, question in enumerate(questions):
+        if not isinstance(question, str) or not question.strip():
+            yield json.dumps({'index': index, 'error': 'Please enter your question first!'}) + '\n'
+            continue
+        card = draw_random_card()
+        details = {}
+        # Run in a copy of the request's context so the worker's spans and logs keep its trace ID
+        future = _batch_executor.submit(contextvars.copy_context().run,
+                                        generate_ai_reading, question.strip(), card, use_cache, details)
+        futures[future] = (index, card, question.strip(), details, time.perf_counter())
+
+    try:
+        for future in as_completed(futures):
+            index, card, question, details, started = futures[future]
+            try:
+                item = {'index': index, 'card': card, 'reading': future.result()}
+                item['reading_id'] = store_reading([card], item['reading'], question, details, started)
+            except Exception as e:
+                log.error(f"❌ Error in batch item {index}: {e}")
+                item = {'index': index, 'error': 'Something went wrong. Please try again.'}
+            yield json.dumps(item, default=json_default) + '\n'
+    finally:
+        # Client went away - don't spend upstream calls on readings nobody will receive
+        for future in futures:
+            future.cancel()
+
+@app.route('/draw-cards/batch', methods=['POST'])
+def draw_cards_batch():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Please send a JSON object with a list of questions.'}), 400
+        questions = data.get('questions')
+        
+        if not isinstance(questions, list) or not questions:
+            return jsonify({'error': 'Please send a non-empty list of questions.'}), 400
+        key = rate_limit_key()
+        limiter = batch_rate_limiter(key)
+        max_questions = min(BATCH_MAX_QUESTIONS, int(limiter.burst)) if limiter.enabled else BATCH_MAX_QUESTIONS
+        if len(questions) > max_questions:
+            return jsonify({'error': f'A batch can hold at most {max_questions} questions.',
+                            'max_questions': max_questions}), 413
+        # Every reading in the batch costs a token from the client's batch bucket
+        limited = rate_limit_response(len(questions), limiter, 'batch:' + key)
+        if limited:
+            return limited
+        
+        log.info(f"📦 Batch of {len(questions)} readings")
+        use_cache = data.get('cache', True) is not False
+        return Response(stream_with_context(stream_batch_readings(questions, use_cache)),
+                        mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        log.error(f"❌ Error in draw_cards_batch route: {e}")
+        return jsonify({'error': 'Something went wrong. Please try again.'}), 500
+
+@app.route('/draw-spread', methods=['POST'])
+@rate_limited
+def draw_spread_route():
+    try:
+        data = request.get_json()
+        question = data.get('question', '').strip()
+        spread_id = data.get('spread', 'three-card')
+        
+        if not question:
+            return jsonify({'error': 'Please enter your question first!'}), 400
+        if not isinstance(spread_id, str) or spread_id not in SPREADS:
+            return jsonify({'error': f"Unknown spread. Choose one of: {', '.join(SPREADS)}"}), 400
+        
+        drawn = draw_spread(spread_id, CARDS)
+        log.info(f"🎴 Spread drawn: {spread_id} - {', '.join(slot['card'].name for slot in drawn)}")
+        for slot in drawn:
+            CARD_DRAWS.inc(slot['card'].name)
+        
+        started = time.perf_counter()
+        details = {}
+        reading = generate_spread_reading(question, spread_id, drawn, data.get('cache', True) is not False, details)
+        reading_id = store_reading([slot['card'] for slot in drawn], reading, question, details, started, spread_id)
         
         return jsonify({
-            'card': card,
-            'reading': reading
+            'spread': spread_id,
+            'cards': drawn,
+            'reading': reading,
+            'sections': parse_spread_reading(reading, drawn),
+            'reading_id': reading_id,
         })
         
     except Exception as e:
-        print(f"❌ Error in draw_card route: {e}")
+        log.error(f"❌ Error in draw_spread route: {e}")
         return jsonify({'error': 'Something went wrong. Please try again.'}), 500
 
 if __name__ == '__main__':
@@ -760,7 +1754,7 @@ if __name__ == '__main__':
     host = '0.0.0.0' if os.environ.get('PORT') else '127.0.0.1'
     debug = not os.environ.get('PORT')  # Only debug locally
     
-    if ANTHROPIC_AVAILABLE and ANTHROPIC_API_KEY:
+    if ai_readings_enabled():
         print("🤖 AI readings enabled")
     else:
         print("📖 Using template readings")
@@ -0,0 +1,209 @@
+"""ASGI entry point with non-blocking reading routes.
+
+`/draw-card` and `/draw-card/stream` run on the event loop with the async
+Anthropic client, so an in-flight reading holds a coroutine instead of a
+worker thread. Every other route is served by the Flask app.
+
+Run with any ASGI server, e.g.:
+
+    uvicorn asgi:application
+
+ANTHROPIC_MAX_CONCURRENCY caps how many upstream calls are in flight at once,
+across these routes and the Flask ones together.
+"""
+import asyncio
+import json
+import math
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from app import (
+    DRAW_RATE_LIMITER,
+    REQUEST_LATENCY,
+    ai_readings_enabled,
+    api_key_identity,
+    client_address,
+    app,
+    draw_random_card,
+    format_sse,
+    format_sse_json,
+    generate_ai_reading_async,
+    get_anthropic_clients,
+    reading_json_bytes,
+    store_reading,
+    stream_ai_reading_async,
+)
+from tracing import REQUEST_ID_HEADER, get_logger, request_id_from, span, start_trace
+
+log = get_logger('asgi')
+
+ERROR_MESSAGE = 'Something went wrong. Please try again.'
+
+flask_application = WsgiToAsgi(app)
+
+def get_header(scope, name):
+    """Return a request header value from an ASGI scope, or ''"""
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+def wants_event_stream(scope):
+    """True when the client negotiated a streamed response"""
+    accept = parse_accept_header(get_header(scope, b'accept'), MIMEAccept)
+    return accept.best_match(['application/json', 'text/event-stream']) == 'text/event-stream'
+
+async def read_body(receive):
+    """Read the full request body"""
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+def rate_limit_key(scope):
+    """Same client identity as the Flask routes: allow-listed API key header, else IP"""
+    identity = api_key_identity(get_header(scope, b'x-api-key'))
+    if identity:
+        return identity
+    forwarded_for = ','.join(value.decode('latin-1') for key, value in scope['headers'] if key == b'x-forwarded-for')
+    client = scope.get('client')
+    return f"ip:{client_address(client[0] if client else None, forwarded_for)}"
+
+async def send_json(send, payload, status=200, headers=()):
+    """Send a complete JSON response"""
+    await send_json_bytes(send, json.dumps(payload).encode('utf-8'), status, headers)
+
+async def send_json_bytes(send, body, status=200, headers=()):
+    """Send an already serialized JSON response"""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def stream_reading_events(send, question, card, use_cache=True):
+    """Send SSE messages: the drawn card first, then the reading as it arrives, then its ID"""
+    started = time.perf_counter()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def send_event(event, payload):
+        await send({'type': 'http.response.body', 'body': format_sse(event, payload).encode('utf-8'), 'more_body': True})
+
+    await send({'type': 'http.response.body', 'body': format_sse_json('card', card.json_text).encode('utf-8'),
+                'more_body': True})
+    try:
+        details, chunks = {}, []
+        async for text in stream_ai_reading_async(question, card, use_cache, details):
+            chunks.append(text)
+            await send_event('reading', {'text': text})
+        reading_id = store_reading([card], ''.join(chunks), question, details, started)
+        await send_event('done', {'reading_id': reading_id} if reading_id else {})
+    except Exception as e:
+        log.error(f"❌ Error in reading stream: {e}")
+        await send_event('error', {'error': ERROR_MESSAGE})
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def draw_card(scope, receive, send, stream):
+    allowed, retry_after = DRAW_RATE_LIMITER.check(rate_limit_key(scope))
+    if not allowed:
+        log.warning(f"🚦 Rate limited: {rate_limit_key(scope)}")
+        headers = [] if retry_after is None else [(b'retry-after', str(math.ceil(retry_after)).encode('ascii'))]
+        await send_json(send, {'error': 'Too many readings requested. Please wait a moment and try again.'},
+                        status=429, headers=headers)
+        return
+
+    try:
+        with span('parse_request'):
+            data = json.loads(await read_body(receive))
+            question = data.get('question', '').strip()
+
+        if not question:
+            await send_json(send, {'error': 'Please enter your question first!'}, status=400)
+            return
+
+        with span('draw_card'):
+            card = draw_random_card()
+        use_cache = data.get('cache', True) is not False
+
+        if stream:
+            await stream_reading_events(send, question, card, use_cache)
+            return
+
+        started = time.perf_counter()
+        details = {}
+        with span('generate_reading'):
+            reading = await generate_ai_reading_async(question, card, use_cache, details)
+        reading_id = store_reading([card], reading, question, details, started)
+        with span('serialize'):
+            await send_json_bytes(send, reading_json_bytes(card, reading, reading_id))
+
+    except Exception as e:
+        log.error(f"❌ Error in async draw_card route: {e}")
+        await send_json(send, {'error': ERROR_MESSAGE}, status=500)
+
+def timed_send(scope, send, route, trace):
+    """Wrap send to record latency and add the request ID when the headers go out, like Flask's after_request"""
+    started = time.perf_counter()
+    request_id = (REQUEST_ID_HEADER.lower().encode('ascii'), trace.trace_id.encode('ascii'))
+
+    async def send_and_time(message):
+        if message['type'] == 'http.response.start':
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route, scope['method'], message['status'])
+            trace.attributes['status'] = message['status']
+            if message['status'] >= 500:
+                trace.error = f"HTTP {message['status']}"
+            message = {**message, 'headers': [*message.get('headers', ()), request_id]}
+        await send(message)
+    return send_and_time
+
+async def traced_draw_card(scope, receive, send, route, stream):
+    request_id = request_id_from(get_header(scope, REQUEST_ID_HEADER.lower().encode('ascii')))
+    with start_trace(f"POST {route}", request_id) as trace:
+        await draw_card(scope, receive, timed_send(scope, send, route, trace), stream)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Long-lived servers pay the SDK import at startup, off the event loop,
+            # rather than blocking the loop on the first reading
+            if ai_readings_enabled():
+                await asyncio.get_running_loop().run_in_executor(None, get_anthropic_clients)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        if scope['path'] == '/draw-card/stream':
+            await traced_draw_card(scope, receive, send, '/draw-card/stream', stream=True)
+            return
+        if scope['path'] == '/draw-card':
+            await traced_draw_card(scope, receive, send, '/draw-card', stream=wants_event_stream(scope))
+            return
+
+    await flask_application(scope, receive, send)
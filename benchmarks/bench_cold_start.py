@@ -0,0 +1,95 @@
+"""Benchmark: cold start - import time and first responses in a fresh interpreter.
+
+Each run starts a new Python process that imports the app, then serves its
+first GET / and first POST /draw-card through the Flask test client, as a
+serverless instance would after a cold start. Reports p50/p99 over the
+runs, plus whether the Anthropic SDK had been imported by the time / was
+served. With --stub-anthropic the first /draw-card makes a real (stubbed)
+SDK call, so it includes importing the SDK and building the client.
+
+    python benchmarks/bench_cold_start.py --runs 20 --stub-anthropic
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from load_test import percentile, start_stub_anthropic  # noqa: E402
+from results import save_results  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MARKER = 'COLD_START '
+
+# Runs in the fresh interpreter; prints one marked JSON line
+CHILD = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+home = time.perf_counter()
+sdk_after_home = 'anthropic' in sys.modules
+client.post('/draw-card', json={{'question': 'What should I focus on at work?', 'cache': False}})
+draw = time.perf_counter()
+print({MARKER!r} + json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_home_ms': (home - imported) * 1000,
+    'first_draw_ms': (draw - home) * 1000,
+    'sdk_loaded_after_home': sdk_after_home,
+    'sdk_loaded_after_draw': 'anthropic' in sys.modules,
+}}), flush=True)
+"""
+
+def cold_start(env):
+    """One fresh process; returns the child's timings plus total process time"""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, capture_output=True,
+                            text=True, timeout=120)
+    elapsed = time.perf_counter() - started
+    for line in output.stdout.splitlines():
+        if line.startswith(MARKER):
+            timings = json.loads(line[len(MARKER):])
+            timings['process_ms'] = elapsed * 1000
+            return timings
+    raise RuntimeError(f"cold start run failed:\n{output.stderr[-2000:]}")
+
+def summarize(runs, name):
+    values = sorted(run[name] for run in runs)
+    return {f"p{p}": percentile(values, p) for p in (50, 99)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--stub-anthropic', action='store_true', help="AI readings from the stub API")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/cold-start-<time>.json)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, RATE_LIMIT_RATE='0', PYTHONDONTWRITEBYTECODE='1')
+    if args.stub_anthropic:
+        env.update(ANTHROPIC_API_KEY='stub', ANTHROPIC_BASE_URL=start_stub_anthropic(0.0, 0.0, 0.0))
+    else:
+        env.pop('ANTHROPIC_API_KEY', None)
+
+    # One throwaway run so every measured run finds the bytecode caches warm
+    cold_start(dict(env, PYTHONDONTWRITEBYTECODE=''))
+    print(f"🧊 {args.runs} cold starts ({'stub API' if args.stub_anthropic else 'template readings'})")
+    runs = [cold_start(env) for _ in range(args.runs)]
+
+    results = {
+        'runs': args.runs,
+        'stub_anthropic': args.stub_anthropic,
+        'sdk_loaded_after_home': any(run['sdk_loaded_after_home'] for run in runs),
+        'sdk_loaded_after_draw': any(run['sdk_loaded_after_draw'] for run in runs),
+    }
+    for name in ('import_ms', 'first_home_ms', 'first_draw_ms', 'process_ms'):
+        results[name] = summarize(runs, name)
+        print(f"  {name:14s} " + '  '.join(f"{p} {v:8.1f}" for p, v in results[name].items()))
+    print(f"  SDK imported after /: {'yes' if results['sdk_loaded_after_home'] else 'no'}, "
+          f"after /draw-card: {'yes' if results['sdk_loaded_after_draw'] else 'no'}")
+
+    save_results('cold-start', results, args.output)
@@ -0,0 +1,101 @@
+"""Benchmark: determine_context() over a synthetic 100k-question corpus.
+
+Compares the original substring scan (two keyword lists, any(... in ...)),
+the same scan over the full contexts.json keyword set, and the
+ContextClassifier, then shows how the corpus is labelled.
+
+    python benchmarks/bench_context.py [corpus_size]
+"""
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.pop('ANTHROPIC_API_KEY', None)
+
+import app  # noqa: E402
+
+OPENERS = [
+    "What should I know about", "How can I improve", "What does the future hold for",
+    "Should I worry about", "Can you give me guidance on", "What energy surrounds",
+]
+TOPICS = [
+    "my relationship with my partner", "my career and next promotion", "my network of friends",
+    "the money I owe on my loan", "my health after a long illness", "my mother and my sister",
+    "my spiritual purpose", "whether to move to a new city", "my day", "the homework I have",
+    "my heart and my feelings", "starting a business", "my kids starting school",
+    "the decision between two job offers", "my meditation practice",
+]
+CONTEXT_TAILS = [
+    "", " I have been feeling stuck lately.", " Things have been hard since last winter.",
+    " I want to make the right choice.", " Everyone around me seems to have it figured out.",
+]
+
+def legacy_determine_context(question):
+    """The original implementation, kept for comparison"""
+    question_lower = question.lower()
+
+    love_keywords = ['love', 'relationship', 'romance', 'partner', 'dating', 'marriage', 'heart', 'feelings']
+    career_keywords = ['career', 'job', 'work', 'business', 'money', 'success', 'professional', 'promotion']
+
+    if any(keyword in question_lower for keyword in love_keywords):
+        return 'love'
+    elif any(keyword in question_lower for keyword in career_keywords):
+        return 'career'
+    else:
+        return 'general'
+
+def substring_scan_all(contexts):
+    """The legacy technique applied to the full contexts.json keyword set"""
+    keyword_lists = [
+        (context['name'], [keyword.rstrip('*') for keyword in context['keywords']])
+        for context in contexts
+    ]
+
+    def determine(question):
+        question_lower = question.lower()
+        for name, keywords in keyword_lists:
+            if any(keyword in question_lower for keyword in keywords):
+                return name
+        return 'general'
+    return determine
+
+def build_corpus(size, seed=42):
+    rng = random.Random(seed)
+    return [f"{rng.choice(OPENERS)} {rng.choice(TOPICS)}?{rng.choice(CONTEXT_TAILS)}" for _ in range(size)]
+
+def time_classifier(fn, corpus):
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for question in corpus:
+            fn(question)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    corpus = build_corpus(size)
+
+    with open(os.path.join(os.path.dirname(__file__), '..', 'contexts.json'), encoding='utf-8') as f:
+        contexts = json.load(f)['contexts']
+    keyword_count = sum(len(context['keywords']) for context in contexts)
+
+    legacy = time_classifier(legacy_determine_context, corpus)
+    scan_all = time_classifier(substring_scan_all(contexts), corpus)
+    classifier = time_classifier(app.determine_context, corpus)
+
+    print(f"🔎 determine_context over {size:,} questions (best of 3)")
+    print(f"  legacy scan, 16 keywords:            {legacy:6.3f}s  ({legacy / size * 1e9:6.0f} ns/question)")
+    print(f"  legacy scan, {keyword_count} config keywords:    {scan_all:6.3f}s  ({scan_all / size * 1e9:6.0f} ns/question)")
+    print(f"  classifier, {keyword_count} keywords:            {classifier:6.3f}s  ({classifier / size * 1e9:6.0f} ns/question)")
+
+    print("\n  context distribution (classifier):")
+    for context, count in Counter(map(app.determine_context, corpus)).most_common():
+        print(f"    {context:10s} {count:7,d}")
+
+    false_hits = [q for q in corpus if 'network' in q and legacy_determine_context(q) == 'career']
+    print(f"\n  'network' questions the legacy scan labelled career: {len(false_hits):,}")
@@ -0,0 +1,53 @@
+"""Micro-benchmark: per-call cost of a fallback reading.
+
+"before" renders all three templates for the card and keeps one, which is
+what generate_fallback_reading() used to do on every call. "after" is the
+current implementation, a lookup in the table built at import.
+
+    python benchmarks/bench_fallback.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.pop('ANTHROPIC_API_KEY', None)
+
+import app  # noqa: E402
+
+QUESTIONS = [
+    "How will my relationship with my partner develop this year?",
+    "Should I ask for a promotion at work next month?",
+    "What should I be reminded of today as I start this new chapter?",
+]
+
+def render_per_call(question, card):
+    """The old implementation: render every template, keep one"""
+    template = app.CONTEXT_CLASSIFIER.template_for(app.determine_context(question))
+    reading_templates = app.render_fallback_templates(card)
+    return reading_templates.get(template, reading_templates['general'])
+
+def bench(fn, number):
+    cards = app.CARDS
+    def run():
+        for i in range(number):
+            fn(QUESTIONS[i % len(QUESTIONS)], cards[i % len(cards)])
+    best = min(timeit.repeat(run, number=1, repeat=5))
+    return best / number * 1e9
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    for question in QUESTIONS:
+        for card in app.CARDS:
+            assert render_per_call(question, card) == app.generate_fallback_reading(question, card)
+
+    before = bench(render_per_call, number)
+    after = bench(app.generate_fallback_reading, number)
+    context_only = bench(lambda question, card: app.determine_context(question), number)
+
+    print(f"📖 Fallback reading, {number:,} calls (best of 5)")
+    print(f"  before (render per call): {before:8.0f} ns/call")
+    print(f"  after  (table lookup):    {after:8.0f} ns/call")
+    print(f"    of which determine_context: {context_only:4.0f} ns/call")
+    print(f"  speedup: {before / after:.1f}x")
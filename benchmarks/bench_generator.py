@@ -0,0 +1,65 @@
+"""Benchmark: full-deck generation against the stub image provider.
+
+Runs generate_all_major_arcana() in a temporary directory with the
+provider replaced by stub_image_provider on a background thread, so it
+measures the generator itself (scheduling, rate limiting, decoding,
+optimization, version index) with a chosen provider latency. Needs the
+generator's own dependencies (openai, requests) but no API key.
+
+    python benchmarks/bench_generator.py --workers 8 --latency-ms 1500 --429-rate 0.05
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import stub_image_provider  # noqa: E402
+from results import save_results  # noqa: E402
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default='free', choices=['openai', 'stability', 'free'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--variants', type=int, default=1)
+    parser.add_argument('--delay', type=float, default=0.0, help="starting spacing between calls")
+    parser.add_argument('--latency-ms', type=float, default=500.0, help="median stub generation time")
+    parser.add_argument('--429-rate', dest='rate_limit_rate', type=float, default=0.0)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/generator-<time>.json)")
+    args = parser.parse_args()
+
+    stub_image_provider.LATENCY.update(latency_ms=args.latency_ms, rate_limit_rate=args.rate_limit_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_image_provider.StubImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update(OPENAI_API_KEY='stub', OPENAI_BASE_URL=f"{base}/v1", STABILITY_API_KEY='stub',
+                      STABILITY_API_BASE=base, POLLINATIONS_BASE=base)
+
+    import tarot_generator  # noqa: E402 - reads the provider endpoints at import
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        started = time.perf_counter()
+        tarot_generator.generate_all_major_arcana(delay_seconds=args.delay, method=args.method,
+                                                  workers=args.workers, variants=args.variants, force=True)
+        elapsed = time.perf_counter() - started
+        images = [path for path in glob.glob(os.path.join('tarot_cards', '*.png')) if not path.endswith('_latest.png')]
+        total_bytes = sum(os.path.getsize(path) for path in images)
+
+    results = {
+        'method': args.method,
+        'workers': args.workers,
+        'stub_latency_ms': args.latency_ms,
+        'stub_429_rate': args.rate_limit_rate,
+        'images': len(images),
+        'seconds': elapsed,
+        'images_per_second': len(images) / elapsed if elapsed else 0.0,
+        'bytes_on_disk': total_bytes,
+    }
+    print(f"🎴 {len(images)} images in {elapsed:.1f}s ({results['images_per_second'] * 60:.1f}/min)")
+    save_results('generator', results, args.output)
@@ -0,0 +1,64 @@
+"""Microbenchmarks for the per-request hot path, saved as JSON.
+
+Covers determine_context(), generate_fallback_reading() and serializing a
+/draw-card response (the precomputed-card body, Flask's jsonify and one
+SSE message). Needs no API key or network.
+
+    python benchmarks/bench_micro.py [--number N] [--output results.json]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.pop('ANTHROPIC_API_KEY', None)
+
+import app  # noqa: E402
+from bench_context import build_corpus  # noqa: E402
+from results import save_results  # noqa: E402
+
+def bench(fn, number, repeat=5):
+    """Best-of-repeat cost of fn() in ns/call"""
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return best / number * 1e9
+
+def cycling(items):
+    """Zero-argument callable returning the next item on each call"""
+    state = {'i': 0}
+    def next_item():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return next_item
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=50_000, help="calls per timing")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/micro-<time>.json)")
+    args = parser.parse_args()
+
+    questions = cycling(build_corpus(1000))
+    cards = cycling(app.CARDS)
+    card = app.CARDS[0]
+    payload = {'card': card, 'reading': app.generate_fallback_reading("How is my career going?", card)}
+
+    cases = {
+        'determine_context': lambda: app.determine_context(questions()),
+        'generate_fallback_reading': lambda: app.generate_fallback_reading(questions(), cards()),
+        'json_dumps_draw_card': lambda: app.reading_json_bytes(card, payload['reading']),
+        'format_sse_reading': lambda: app.format_sse('reading', {'text': payload['reading']}),
+    }
+
+    results = {}
+    print(f"⏱️ Microbenchmarks, {args.number:,} calls per timing (best of 5)")
+    for name, fn in cases.items():
+        ns = bench(fn, args.number)
+        results[name] = {'ns_per_call': ns, 'calls_per_second': 1e9 / ns}
+        print(f"  {name:28s} {ns:9.0f} ns/call")
+
+    with app.app.app_context():
+        ns = bench(lambda: app.jsonify(payload), args.number // 10)
+    results['jsonify_draw_card'] = {'ns_per_call': ns, 'calls_per_second': 1e9 / ns}
+    print(f"  {'jsonify_draw_card':28s} {ns:9.0f} ns/call")
+
+    save_results('micro', results, args.output)
@@ -0,0 +1,49 @@
+"""Compare two benchmark result files metric by metric.
+
+Every numeric leaf present in both runs is printed with its relative
+change. For latencies and ns/call lower is better; for throughput
+and counts of completed work higher is better. Run settings (target QPS,
+worker counts, stub parameters) are skipped.
+
+    python benchmarks/compare.py results/micro-before.json results/micro-after.json
+"""
+import json
+import sys
+
+HIGHER_IS_BETTER = ('per_second', 'achieved_qps', 'speedup', 'requests', 'outcomes.ok', 'images')
+
+# Run settings rather than measurements
+SETTINGS = ('target_qps', 'workers', 'variants', 'stub_', 'runs')
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+def compare(before, after):
+    old = dict(flatten(before['results']))
+    new = dict(flatten(after['results']))
+    rows = []
+    for metric in old:
+        if metric not in new or metric.startswith(SETTINGS):
+            continue
+        change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+        better = change > 0 if any(tag in metric for tag in HIGHER_IS_BETTER) else change < 0
+        rows.append((metric, old[metric], new[metric], change, better))
+    return rows
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        before = json.load(f)
+    with open(sys.argv[2]) as f:
+        after = json.load(f)
+
+    print(f"📊 {before['benchmark']}: {before.get('commit')} -> {after.get('commit')}")
+    for metric, old, new, change, better in compare(before, after):
+        marker = '✅' if better else ('❌' if abs(change) >= 5 else '  ')
+        print(f"  {marker} {metric:45s} {old:14.2f} -> {new:14.2f}  ({change:+6.1f}%)")
@@ -0,0 +1,170 @@
+"""Open-loop load test for the reading routes, reporting p50/p95/p99.
+
+Requests are scheduled at a fixed rate (--qps) whether or not earlier ones
+have finished. Latency is measured from each request's scheduled start, so
+a slow server shows up as queueing instead of quietly lowering the load.
+Results are printed and saved as JSON.
+
+Against a running server (start it with RATE_LIMIT_RATE=0):
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --qps 50 --duration 30
+
+Fully offline, with the app in-process and the stub Anthropic API on a thread:
+
+    python benchmarks/load_test.py --in-process --stub-anthropic --ttft-ms 500 --qps 20
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from results import save_results  # noqa: E402
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def start_stub_anthropic(ttft_ms, tokens_per_second, error_rate):
+    """Run the stub Messages API on a background thread; returns its base URL"""
+    import stub_anthropic
+    stub_anthropic.LATENCY.update(ttft_ms=ttft_ms, tokens_per_second=tokens_per_second, error_rate=error_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_anthropic.StubMessagesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+class HttpClient:
+    """Keep-alive connection per worker thread"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+
+    def post(self, path, body, headers):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+class InProcessClient:
+    """Flask test client - no sockets, measures the app alone"""
+
+    def __init__(self):
+        import app
+        self.app = app.app
+
+    def post(self, path, body, headers):
+        response = self.app.test_client().post(path, data=body, headers=headers)
+        response.get_data()
+        return response.status_code
+
+def run_load(client, path, qps, duration, concurrency, stream, use_cache):
+    # Imported late: bench_context imports the app, which must see the environment set in __main__
+    from bench_context import build_corpus
+    questions = build_corpus(max(1, int(qps * duration)))
+    headers = {'Content-Type': 'application/json',
+               'Accept': 'text/event-stream' if stream else 'application/json'}
+    latencies, service_times = [], []
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def one(question, scheduled):
+        sent = time.perf_counter()
+        try:
+            status = client.post(path, json.dumps({'question': question, 'cache': use_cache}), headers)
+            outcome = 'ok' if status < 400 else f"http_{status}"
+        except Exception as e:
+            outcome = type(e).__name__
+        done = time.perf_counter()
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == 'ok':
+                latencies.append(done - scheduled)
+                service_times.append(done - sent)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, question in enumerate(questions):
+            scheduled = started + i / qps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, question, scheduled)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    service_times.sort()
+    total = sum(outcomes.values())
+    return {
+        'target_qps': qps,
+        'achieved_qps': total / elapsed,
+        'requests': total,
+        'errors': total - outcomes['ok'],
+        'error_rate': (total - outcomes['ok']) / total if total else 0.0,
+        'outcomes': dict(outcomes),
+        'latency_ms': {f"p{p}": percentile(latencies, p) * 1000 for p in (50, 95, 99)} if latencies else {},
+        'service_time_ms': {f"p{p}": percentile(service_times, p) * 1000 for p in (50, 95, 99)} if service_times else {},
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server to load (ignored with --in-process)")
+    parser.add_argument('--in-process', action='store_true', help="drive the Flask app directly, no server needed")
+    parser.add_argument('--path', default='/draw-card')
+    parser.add_argument('--qps', type=float, default=20)
+    parser.add_argument('--duration', type=float, default=10, help="seconds of load")
+    parser.add_argument('--concurrency', type=int, default=64, help="most requests in flight at once")
+    parser.add_argument('--stream', action='store_true', help="ask for text/event-stream")
+    parser.add_argument('--no-cache', action='store_true', help="send cache: false so every request is a miss")
+    parser.add_argument('--stub-anthropic', action='store_true', help="in-process only: AI readings from the stub API")
+    parser.add_argument('--ttft-ms', type=float, default=0.0)
+    parser.add_argument('--tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    if args.in_process:
+        os.environ['RATE_LIMIT_RATE'] = '0'
+        if args.stub_anthropic:
+            os.environ['ANTHROPIC_API_KEY'] = 'stub'
+            os.environ['ANTHROPIC_BASE_URL'] = start_stub_anthropic(args.ttft_ms, args.tokens_per_second, args.error_rate)
+        else:
+            os.environ.pop('ANTHROPIC_API_KEY', None)
+        client = InProcessClient()
+        target = 'in-process'
+    else:
+        client = HttpClient(args.url)
+        target = args.url
+
+    print(f"🚀 {args.qps:g} QPS for {args.duration:g}s against {target}{args.path}")
+    results = run_load(client, args.path, args.qps, args.duration, args.concurrency, args.stream, not args.no_cache)
+    results.update(target=target, path=args.path, stream=args.stream, cache=not args.no_cache)
+
+    print(f"  achieved {results['achieved_qps']:.1f} QPS, {results['requests']} requests, {results['errors']} errors")
+    for name in ('latency_ms', 'service_time_ms'):
+        if results[name]:
+            print(f"  {name:16s} " + '  '.join(f"{p} {v:8.1f}" for p, v in results[name].items()))
+    if results['outcomes'].get('http_429'):
+        print("  ⚠️ Got 429s - start the server with RATE_LIMIT_RATE=0")
+
+    save_results('load', results, args.output)
@@ -0,0 +1,184 @@
+"""Local stand-in for the Anthropic Messages API.
+
+Checks that reading requests use the cacheable prompt layout (a system
+prefix and a card block each ending in a cache breakpoint, followed by the
+question) and answers with a canned reading. Prompt caching is simulated:
+the first request for a given prefix reports cache_creation_input_tokens,
+later ones report cache_read_input_tokens.
+
+Latency is simulated too: time to first token is drawn from a log-normal
+distribution (--ttft-ms median, --ttft-sigma spread), then output tokens
+arrive at --tokens-per-second. --error-rate answers a fraction of
+requests with 529 overloaded errors. The defaults answer instantly.
+
+    python benchmarks/stub_anthropic.py --port 8765 --ttft-ms 600 --tokens-per-second 60
+    ANTHROPIC_API_KEY=stub ANTHROPIC_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_READING = """CARD MESSAGE:
+This is a stub reading from the local Messages API stand-in.
+
+HOW THIS RELATES TO YOU:
+The card's themes are echoed back without calling the real API.
+
+GUIDANCE AND INSIGHTS:
+- First stub insight
+- Second stub insight
+- Third stub insight
+
+MOVING FORWARD:
+Keep measuring.
+
+KEY TAKEAWAY:
+Stubs make offline runs possible."""
+
+_seen_prefixes = set()
+_seen_lock = threading.Lock()
+
+# Simulated upstream behaviour - set from the command line
+LATENCY = {'ttft_ms': 0.0, 'ttft_sigma': 0.0, 'tokens_per_second': 0.0, 'error_rate': 0.0}
+
+def time_to_first_token():
+    if not LATENCY['ttft_ms']:
+        return 0.0
+    return random.lognormvariate(0, LATENCY['ttft_sigma']) * LATENCY['ttft_ms'] / 1000
+
+def seconds_per_token():
+    return 1 / LATENCY['tokens_per_second'] if LATENCY['tokens_per_second'] else 0.0
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def check_request_shape(headers, body):
+    """Return a list of problems with a reading request, empty when it is well-formed"""
+    problems = []
+    if 'prompt-caching' not in headers.get('anthropic-beta', ''):
+        problems.append("missing prompt-caching anthropic-beta header")
+
+    system = body.get('system')
+    if not isinstance(system, list) or not system:
+        problems.append("system must be a non-empty list of text blocks")
+    elif 'cache_control' not in system[-1]:
+        problems.append("last system block must carry a cache_control breakpoint")
+
+    messages = body.get('messages') or []
+    if len(messages) != 1 or messages[0].get('role') != 'user':
+        problems.append("expected exactly one user message")
+    else:
+        content = messages[0].get('content')
+        if not isinstance(content, list) or len(content) < 2:
+            problems.append("user content must be [card or spread block, question block]")
+        else:
+            # Spread layouts vary per draw and are deliberately left uncached
+            if 'cache_control' not in content[0] and not content[0]['text'].startswith('Spread:'):
+                problems.append("card block must carry a cache_control breakpoint")
+            if 'cache_control' in content[-1]:
+                problems.append("question block must not be cached")
+    return problems
+
+def simulate_usage(body):
+    """Token usage as the API would report it, with prompt-cache reads/writes"""
+    usage = {'input_tokens': 0, 'output_tokens': estimate_tokens(STUB_READING),
+             'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0}
+    prefix = hashlib.sha256()
+    blocks = list(body.get('system') or []) + list(body['messages'][0]['content'])
+    for block in blocks:
+        prefix.update(block['text'].encode('utf-8'))
+        tokens = estimate_tokens(block['text'])
+        if 'cache_control' not in block:
+            usage['input_tokens'] += tokens
+            continue
+        with _seen_lock:
+            hit = prefix.hexdigest() in _seen_prefixes
+            _seen_prefixes.add(prefix.hexdigest())
+        usage['cache_read_input_tokens' if hit else 'cache_creation_input_tokens'] += tokens
+    return usage
+
+class StubMessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/messages':
+            self.send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))))
+        problems = check_request_shape(self.headers, body)
+        if problems:
+            print(f"❌ Bad request shape: {'; '.join(problems)}")
+            self.send_json(400, {'type': 'error', 'error': {'type': 'invalid_request_error', 'message': '; '.join(problems)}})
+            return
+
+        if random.random() < LATENCY['error_rate']:
+            self.send_json(529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded (simulated)'}})
+            return
+
+        usage = simulate_usage(body)
+        time.sleep(time_to_first_token())
+        message = {
+            'id': 'msg_stub', 'type': 'message', 'role': 'assistant', 'model': body.get('model'),
+            'content': [{'type': 'text', 'text': STUB_READING}],
+            'stop_reason': 'end_turn', 'stop_sequence': None, 'usage': usage,
+        }
+        if body.get('stream'):
+            self.send_stream(message)
+        else:
+            time.sleep(usage['output_tokens'] * seconds_per_token())
+            self.send_json(200, message)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, message):
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name, payload):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        text = message['content'][0]['text']
+        event('message_start', {'type': 'message_start', 'message': dict(message, content=[], stop_reason=None)})
+        event('content_block_start', {'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        words = text.split(' ')
+        delay = message['usage']['output_tokens'] * seconds_per_token() / len(words)
+        for word in words:
+            time.sleep(delay)
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': word + ' '}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                'usage': {'output_tokens': message['usage']['output_tokens']}})
+        event('message_stop', {'type': 'message_stop'})
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttft-ms', type=float, default=0.0, help="median time to first token")
+    parser.add_argument('--ttft-sigma', type=float, default=0.5, help="log-normal spread of time to first token")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="output token rate (0 = instant)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 529")
+    args = parser.parse_args()
+    LATENCY.update(ttft_ms=args.ttft_ms, ttft_sigma=args.ttft_sigma,
+                   tokens_per_second=args.tokens_per_second, error_rate=args.error_rate)
+
+    print(f"🧪 Stub Anthropic API on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), StubMessagesHandler).serve_forever()
@@ -0,0 +1,129 @@
+"""Local stand-in for the image providers used by tarot_generator.py.
+
+Answers the OpenAI images endpoint (base64 JSON), Stability text-to-image
+(raw PNG or base64 JSON, following Accept) and Pollinations (raw PNG). The
+image is a deterministic PNG derived from the prompt: a card-shaped
+gradient with a transparent margin, built with zlib only so it runs on a
+bare CI box. Latency is log-normal around --latency-ms, and --429-rate
+answers a fraction of requests with 429 + Retry-After.
+
+    python benchmarks/stub_image_provider.py --port 8766 --latency-ms 2000
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8766/v1 \\
+    STABILITY_API_BASE=http://127.0.0.1:8766 POLLINATIONS_BASE=http://127.0.0.1:8766 python tarot_generator.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+LATENCY = {'latency_ms': 0.0, 'sigma': 0.5, 'rate_limit_rate': 0.0}
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+@lru_cache(maxsize=64)
+def render_png(prompt, width, height):
+    """Deterministic RGBA PNG for a prompt: vertical gradient, transparent margin"""
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    top, bottom = digest[:3], digest[3:6]
+    margin_x, margin_y = width // 16, height // 16
+    clear = bytes(4 * margin_x)
+    blank_row = b'\x00' + bytes(4 * width)
+
+    rows = []
+    for y in range(height):
+        if y < margin_y or y >= height - margin_y:
+            rows.append(blank_row)
+            continue
+        t = (y - margin_y) / max(1, height - 2 * margin_y - 1)
+        pixel = bytes(round(a + (b - a) * t) for a, b in zip(top, bottom)) + b'\xff'
+        rows.append(b'\x00' + clear + pixel * (width - 2 * margin_x) + clear)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header)
+            + _chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + _chunk(b'IEND', b''))
+
+def simulated_latency():
+    if not LATENCY['latency_ms']:
+        return 0.0
+    return random.lognormvariate(0, LATENCY['sigma']) * LATENCY['latency_ms'] / 1000
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))) or b'{}')
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/v1/images/generations':
+            width, height = map(int, body.get('size', '1024x1024').split('x'))
+            if self.simulate():
+                png = render_png(body.get('prompt', ''), width, height)
+                self.send_body(200, 'application/json', json.dumps({
+                    'created': int(time.time()),
+                    'data': [{'b64_json': base64.b64encode(png).decode('ascii')}],
+                }).encode('utf-8'))
+        elif re.fullmatch(r'/v1/generation/[^/]+/text-to-image', path):
+            prompt = ' '.join(p.get('text', '') for p in body.get('text_prompts', []))
+            if self.simulate():
+                png = render_png(prompt, body.get('width', 1024), body.get('height', 1024))
+                if 'image/png' in self.headers.get('accept', ''):
+                    self.send_body(200, 'image/png', png)
+                else:
+                    self.send_body(200, 'application/json', json.dumps(
+                        {'artifacts': [{'base64': base64.b64encode(png).decode('ascii')}]}).encode('utf-8'))
+        else:
+            self.send_body(404, 'application/json', b'{"error": "not found"}')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith('/prompt/'):
+            self.send_body(404, 'application/json', b'{"error": "not found"}')
+            return
+        query = parse_qs(url.query)
+        if self.simulate():
+            png = render_png(unquote(url.path[len('/prompt/'):]),
+                             int(query.get('width', ['1024'])[0]), int(query.get('height', ['1024'])[0]))
+            self.send_body(200, 'image/png', png)
+
+    def simulate(self):
+        """Sleep like a real provider; False when a 429 was sent instead"""
+        if random.random() < LATENCY['rate_limit_rate']:
+            self.send_body(429, 'application/json', b'{"error": "rate limited (simulated)"}',
+                           {'Retry-After': '1'})
+            return False
+        time.sleep(simulated_latency())
+        return True
+
+    def send_body(self, status, content_type, data, headers=None):
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="median generation time")
+    parser.add_argument('--sigma', type=float, default=0.5, help="log-normal spread of generation time")
+    parser.add_argument('--429-rate', dest='rate_limit_rate', type=float, default=0.0,
+                        help="fraction of requests answered with 429")
+    args = parser.parse_args()
+    LATENCY.update(latency_ms=args.latency_ms, sigma=args.sigma, rate_limit_rate=args.rate_limit_rate)
+
+    print(f"🧪 Stub image provider on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), StubImageHandler).serve_forever()
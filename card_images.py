@@ -0,0 +1,151 @@
+"""Card artwork served as resized AVIF/WebP/PNG derivatives.
+
+Masters are the PNGs in major_arcana_cards/ ("NN_slug.png", NN = card id).
+Derivatives are built at a few fixed widths, named after the master's
+content hash, and persisted in CARD_IMAGE_CACHE_DIR. A missing derivative
+is built on first request and kept, so each one is encoded at most once
+per master version. Build them all ahead of time with:
+
+    python card_images.py
+"""
+import functools
+import glob
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is optional - without it the master PNG is served as-is. It's only
+# imported on the first image request, keeping it out of app startup
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MASTERS_DIR = os.path.join(BASE_DIR, 'major_arcana_cards')
+CACHE_DIR = os.getenv('CARD_IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'static', 'cards'))
+
+WIDTHS = (160, 320, 480, 640)
+DEFAULT_WIDTH = 320
+
+MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png'}
+_ENCODE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 80, 'method': 6},
+    'png': {'optimize': True},
+}
+
+@functools.lru_cache(maxsize=None)
+def supported_formats():
+    """Derivative formats this Pillow build can encode, best first (probed once)"""
+    if not PIL_AVAILABLE:
+        return ('png',)
+    from PIL import features
+    return tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt)) + ('png',)
+
+def _find_masters():
+    masters = {}
+    for path in glob.glob(os.path.join(MASTERS_DIR, '*.png')):
+        match = re.match(r'(\d+)_(.+)\.png$', os.path.basename(path))
+        if match:
+            masters[int(match.group(1))] = (path, match.group(2))
+    return masters
+
+MASTERS = _find_masters()
+
+_hashes = {}
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+def master_hash(card_id):
+    """Short content hash of a card's master image - part of every image URL"""
+    digest = _hashes.get(card_id)
+    if digest is None:
+        with open(MASTERS[card_id][0], 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        _hashes[card_id] = digest
+    return digest
+
+def snap_width(width):
+    """Smallest derivative width covering the requested width"""
+    for candidate in WIDTHS:
+        if candidate >= width:
+            return candidate
+    return WIDTHS[-1]
+
+def negotiate_format(accept_mimetypes):
+    """Best derivative format the client accepts"""
+    for fmt in supported_formats():
+        if accept_mimetypes[MIMETYPES[fmt]] > 0:
+            return fmt
+    return 'png'
+
+def image_url(card_id, width, fmt):
+    return f"/cards/{card_id}/image?w={width}&fmt={fmt}&v={master_hash(card_id)}"
+
+@functools.lru_cache(maxsize=None)
+def image_sources(card_id):
+    """srcset strings per format, for a <picture> element (hashes the master on first call)"""
+    if card_id not in MASTERS:
+        return None
+    widths = WIDTHS if PIL_AVAILABLE else (DEFAULT_WIDTH,)
+    return {
+        'src': image_url(card_id, DEFAULT_WIDTH, 'png'),
+        'srcset': {
+            fmt: ', '.join(f"{image_url(card_id, width, fmt)} {width}w" for width in widths)
+            for fmt in supported_formats()
+        },
+    }
+
+def _build_derivative(master_path, path, width, fmt):
+    from PIL import Image
+    with Image.open(master_path) as master:
+        height = round(master.height * width / master.width)
+        image = master.resize((width, height), Image.LANCZOS)
+    if fmt != 'png' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    # Write to a temp file and rename, so readers never see a partial image
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format=fmt.upper(), **_ENCODE_OPTIONS[fmt])
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def get_derivative(card_id, width, fmt):
+    """Path to the derivative, building and persisting it on first use"""
+    master_path, slug = MASTERS[card_id]
+    if not PIL_AVAILABLE:
+        return master_path
+
+    path = os.path.join(CACHE_DIR, f"{card_id:02d}_{slug}-{master_hash(card_id)}-{width}.{fmt}")
+    if os.path.exists(path):
+        return path
+
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(path, threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            print(f"🖼️ Building derivative: {os.path.basename(path)}")
+            _build_derivative(master_path, path, width, fmt)
+    return path
+
+def precompute_derivatives(max_workers=None):
+    """Build every derivative for every card; returns how many exist"""
+    jobs = [(card_id, width, fmt) for card_id in MASTERS for width in WIDTHS for fmt in supported_formats()]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return len(list(pool.map(lambda job: get_derivative(*job), jobs)))
+
+if __name__ == '__main__':
+    if not PIL_AVAILABLE:
+        print("❌ Pillow is not installed - nothing to build")
+        raise SystemExit(1)
+    print(f"🖼️ Building {len(MASTERS)} cards x {len(WIDTHS)} widths x formats {', '.join(supported_formats())}")
+    count = precompute_derivatives()
+    print(f"✅ {count} derivatives ready in {CACHE_DIR}")
@@ -0,0 +1,128 @@
+"""The Major Arcana as an immutable registry, shared by the app and the generator.
+
+Cards live in a JSON data file (cards.json) and are loaded once into frozen,
+slotted Card records, indexed by id, number, slug and name. Each card's
+JSON is serialized once, on first use, so responses splice in precomputed
+bytes instead of re-encoding the card per request. The app passes
+extra_fields to add per-card data that only it knows about (image URLs);
+it runs on first use too, keeping its cost out of startup.
+"""
+import functools
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cards.json')
+
+@dataclass(frozen=True, slots=True)
+class Card:
+    id: int
+    number: str
+    name: str
+    slug: str
+    symbol: str
+    meaning: str
+    keywords: tuple
+    extra_fields: object = field(default=None, compare=False, repr=False)
+    _serialized: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def filename(self):
+        """Image file stem, e.g. 00_the_fool"""
+        return f"{self.id:02d}_{self.slug}"
+
+    def _fields(self):
+        return {
+            'id': self.id,
+            'number': self.number,
+            'name': self.name,
+            'slug': self.slug,
+            'symbol': self.symbol,
+            'meaning': self.meaning,
+            'keywords': list(self.keywords),
+        }
+
+    def _serialize(self):
+        """(extra, json_text, json_bytes), built on first use and kept"""
+        cached = self._serialized.get('json')
+        if cached is None:
+            extra = MappingProxyType(dict(self.extra_fields(self)) if self.extra_fields else {})
+            text = json.dumps({**self._fields(), **extra}, ensure_ascii=False)
+            cached = self._serialized['json'] = (extra, text, text.encode('utf-8'))
+        return cached
+
+    @property
+    def extra(self):
+        return self._serialize()[0]
+
+    @property
+    def json_text(self):
+        return self._serialize()[1]
+
+    @property
+    def json_bytes(self):
+        return self._serialize()[2]
+
+    def to_dict(self):
+        return {**self._fields(), **self.extra}
+
+def json_default(value):
+    """json.dumps default= hook for payloads that contain Card records"""
+    if isinstance(value, Card):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class CardRegistry:
+    """Cards in deck order with lookup indexes and a precomputed catalog"""
+
+    def __init__(self, cards):
+        self.cards = tuple(cards)
+        self.by_id = {card.id: card for card in self.cards}
+        self.by_number = {card.number: card for card in self.cards}
+        self.by_slug = {card.slug: card for card in self.cards}
+        self.by_name = {card.name.lower(): card for card in self.cards}
+        if not (len(self.by_id) == len(self.by_number) == len(self.by_slug) == len(self.by_name) == len(self.cards)):
+            raise ValueError("card ids, numbers, slugs and names must be unique")
+
+    @functools.cached_property
+    def catalog_bytes(self):
+        return b'{"cards":[' + b','.join(card.json_bytes for card in self.cards) + b']}'
+
+    @functools.cached_property
+    def catalog_etag(self):
+        return hashlib.sha256(self.catalog_bytes).hexdigest()[:16]
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def get(self, key):
+        """Look a card up by id, Roman numeral, slug or (case-insensitive) name"""
+        if isinstance(key, int):
+            return self.by_id.get(key)
+        key = str(key).strip()
+        return (self.by_number.get(key.upper()) or self.by_slug.get(key.lower().replace(' ', '_'))
+                or self.by_name.get(key.lower()))
+
+def load_card_registry(path=DEFAULT_PATH, extra_fields=None):
+    """Load cards from a JSON data file; extra_fields(card) adds serialized fields"""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)['cards']
+
+    cards = []
+    for entry in entries:
+        cards.append(Card(
+            id=int(entry['id']),
+            number=entry['number'],
+            name=entry['name'],
+            slug=entry['slug'],
+            symbol=entry['symbol'],
+            meaning=entry['meaning'],
+            keywords=tuple(entry['keywords']),
+            extra_fields=extra_fields,
+        ))
+    return CardRegistry(cards)
@@ -0,0 +1,85 @@
+"""Circuit breaker for the upstream reading API."""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream when the breaker refuses the call"""
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker shared by every request in the process
+
+    After failure_threshold consecutive failures the breaker opens and
+    allow_request() returns False, so callers skip the upstream call. Once
+    reset_timeout seconds have passed a single probe is let through
+    (half-open); its success closes the breaker, its failure re-opens it.
+    A probe that never reports back is replaced after another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self, claim_probe=True):
+        """True if the caller may try the upstream call now
+
+        With claim_probe=False a half-open breaker answers without handing out
+        its probe - for an early check by a caller that asks again right
+        before the call.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_started_at = None
+            if self.state == HALF_OPEN and (self._probe_started_at is None
+                                            or now - self._probe_started_at >= self.reset_timeout):
+                if claim_probe:
+                    self._probe_started_at = now
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probe_started_at = None
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'probe_in': retry_in,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited,
+            }
@@ -0,0 +1,127 @@
+"""Keyword classifier that decides which context a question is about.
+
+Contexts and their weighted keywords live in a JSON config (contexts.json)
+and are compiled once into read-only lookup tables. A question is split on
+whitespace and each token is matched through an LRU-cached pure function,
+so a token seen before costs one cache hit and classifying never changes
+shared state. Every occurrence of a keyword adds its weight. A keyword
+matches the whole word plus a plural "s"/"es"; a trailing "*" turns it
+into a prefix match ("invest*" matches "investment"), which never matches
+inside a word ("work*" skips "network"). Multi-word keywords ("break up")
+match consecutive words.
+
+A context marked "secondary" (e.g. decision) is only chosen when no other
+context matched: "Should I tell my partner?" is about love, not a decision.
+"""
+import functools
+import json
+import re
+import string
+
+_WORD = re.compile(r'\w+')
+# Punctuation that may end the last word of a phrase ("break up?")
+_TRAILING = string.punctuation
+# Distinct tokens whose matches are cached per classifier (least recently used evicted)
+TOKEN_CACHE_SIZE = 50_000
+_NO_MATCH = ((), None)
+
+class ContextClassifier:
+    """Scores a question against every context with one cached lookup per token"""
+
+    def __init__(self, contexts, default='general'):
+        self.default = default
+        self.contexts = [context['name'] for context in contexts]
+        self.templates = {context['name']: context.get('template', default) for context in contexts}
+        self.templates.setdefault(default, default)
+        self.secondary = frozenset(context['name'] for context in contexts if context.get('secondary'))
+        self._priority = {name: index for index, name in enumerate(self.contexts)}
+
+        # Word resolves to (context, weight, secondary): exact forms by dict, prefixes longest first;
+        # phrases are indexed by their first word
+        self._forms = {}
+        self._prefixes = []
+        self._phrases = {}
+        for context in contexts:
+            for keyword, weight in context['keywords'].items():
+                entry = (context['name'], weight, context['name'] in self.secondary)
+                words = keyword.lower().split()
+                if len(words) > 1:
+                    rest = ' '.join(words[1:])
+                    prefix = rest[:-1] if rest.endswith('*') else None
+                    forms = frozenset() if prefix else frozenset((rest, rest + 's', rest + 'es'))
+                    self._phrases.setdefault(words[0], []).append((len(words) - 1, forms, prefix, entry))
+                elif words[0].endswith('*'):
+                    self._prefixes.append((words[0][:-1], entry))
+                else:
+                    for form in (words[0], words[0] + 's', words[0] + 'es'):
+                        self._forms.setdefault(form, entry)
+        self._prefixes = tuple(sorted(self._prefixes, key=lambda prefix: -len(prefix[0])))
+        self._phrases = {word: tuple(sorted(phrases, key=lambda phrase: -phrase[0]))
+                         for word, phrases in self._phrases.items()}
+        # Pure function of the token, so caching it can't change any answer
+        self._match_token = functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)(self._match)
+
+    def _resolve(self, word):
+        entry = self._forms.get(word)
+        if entry is None:
+            for prefix, prefix_entry in self._prefixes:
+                if word.startswith(prefix):
+                    return prefix_entry
+        return entry
+
+    def _match(self, token):
+        """(keyword entries, phrases starting here) for a lowercased token"""
+        words = _WORD.findall(token)
+        entries = tuple(entry for entry in map(self._resolve, words) if entry is not None)
+        # A phrase can only start on a token that ends in its first word ("should", not "should,")
+        phrases = self._phrases.get(words[-1]) if words and token.endswith(words[-1]) else None
+        if not entries and phrases is None:
+            return _NO_MATCH
+        return entries, phrases
+
+    def _tally(self, question):
+        """Keyword weight per context, split into (primary, secondary) totals"""
+        primary = {}
+        secondary = {}
+        tokens = question.lower().split()
+        match = self._match_token
+        for index, token in enumerate(tokens):
+            entries, phrases = match(token)
+            for name, weight, is_secondary in entries:
+                totals = secondary if is_secondary else primary
+                totals[name] = totals.get(name, 0) + weight
+            if phrases is not None:
+                for length, forms, prefix, (name, weight, is_secondary) in phrases:
+                    rest = ' '.join(tokens[index + 1:index + 1 + length]).rstrip(_TRAILING)
+                    if rest in forms or (prefix and rest.startswith(prefix)):
+                        totals = secondary if is_secondary else primary
+                        totals[name] = totals.get(name, 0) + weight
+                        break
+        return primary, secondary
+
+    def scores(self, question):
+        """Total keyword weight per context found in the question"""
+        primary, secondary = self._tally(question)
+        return {**primary, **secondary}
+
+    def classify(self, question):
+        """Highest-scoring context; ties go to the context listed first in the config"""
+        primary, secondary = self._tally(question)
+        totals = primary or secondary
+        if len(totals) == 1:
+            for name in totals:
+                return name
+        if not totals:
+            return self.default
+        priority = self._priority
+        return max(totals, key=lambda name: (totals[name], -priority[name]))
+
+    def template_for(self, context):
+        """Fallback reading template used for a context"""
+        return self.templates.get(context, self.default)
+
+def load_context_classifier(path):
+    """Build a classifier from a contexts JSON config file"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return ContextClassifier(config['contexts'], default=config.get('default', 'general'))
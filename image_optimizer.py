@@ -0,0 +1,156 @@
+"""Post-generation optimization for card masters.
+
+Each image is cropped to the bounding box of its visible (alpha) pixels,
+dropped to RGB when fully opaque and recompressed losslessly. Pass
+`colors` to palette-quantize instead - near-lossless and much smaller.
+Results are recorded in optimize_manifest.json next to the images, and
+files whose content already matches the manifest are skipped.
+
+    python image_optimizer.py tarot_cards major_arcana_cards
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+MANIFEST_NAME = 'optimize_manifest.json'
+
+# Alpha at or below this counts as transparent margin (generators leave faint noise)
+ALPHA_THRESHOLD = 8
+
+_manifest_lock = threading.Lock()
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def alpha_bbox(image, threshold=ALPHA_THRESHOLD):
+    """Bounding box of pixels with alpha above threshold, None when fully opaque"""
+    if 'A' not in image.getbands():
+        return None
+    # point() applies a lookup table in C over the whole channel
+    mask = image.getchannel('A').point(lambda a: 255 if a > threshold else 0)
+    return mask.getbbox()
+
+def _drop_opaque_alpha(image):
+    if image.mode == 'RGBA' and image.getchannel('A').getextrema()[0] == 255:
+        return image.convert('RGB')
+    return image
+
+def optimize_image(path, colors=None, threshold=ALPHA_THRESHOLD):
+    """Crop and recompress one PNG in place; returns its manifest entry"""
+    original_bytes = os.path.getsize(path)
+    with Image.open(path) as source:
+        source.load()
+        original_size = source.size
+        image = source
+
+    box = alpha_bbox(image, threshold)
+    if box and box != (0, 0) + image.size:
+        image = image.crop(box)
+
+    if colors:
+        image = image.quantize(colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    else:
+        image = _drop_opaque_alpha(image)
+
+    replaced = False
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format='PNG', optimize=True)
+        # Only keep the result when it is actually smaller (or was cropped)
+        if os.path.getsize(tmp_path) < original_bytes or image.size != original_size:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            os.replace(tmp_path, path)
+            replaced = True
+        else:
+            os.unlink(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    with Image.open(path) as result:
+        size, mode = result.size, result.mode
+    return {
+        'sha256': file_digest(path),
+        'original_bytes': original_bytes,
+        'bytes': os.path.getsize(path),
+        'original_size': list(original_size),
+        'size': list(size),
+        'mode': mode,
+        'quantized_colors': colors if replaced else None,
+    }
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(directory, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+def record_results(directory, results):
+    """Merge {filename: entry} into the directory's manifest"""
+    with _manifest_lock:
+        manifest = load_manifest(directory)
+        manifest.update(results)
+        _save_manifest(directory, manifest)
+
+def optimize_and_record(path, colors=None):
+    """Optimize one freshly generated image and add it to the manifest"""
+    entry = optimize_image(path, colors)
+    record_results(os.path.dirname(path) or '.', {os.path.basename(path): entry})
+    saved = entry['original_bytes'] - entry['bytes']
+    print(f"🗜️ Optimized {os.path.basename(path)}: {entry['original_bytes'] // 1024} KB -> "
+          f"{entry['bytes'] // 1024} KB, {entry['original_size'][0]}x{entry['original_size'][1]} -> "
+          f"{entry['size'][0]}x{entry['size'][1]} (saved {saved * 100 // max(entry['original_bytes'], 1)}%)")
+    return entry
+
+def optimize_directory(directory, colors=None, max_workers=None, force=False):
+    """Optimize every PNG in a directory in parallel; returns the new manifest entries"""
+    manifest = load_manifest(directory)
+    paths = [
+        path for path in sorted(glob.glob(os.path.join(directory, '*.png')))
+        # Symlinked _latest pointers follow their target - rewriting them would break the link
+        if not os.path.islink(path)
+        and (force or manifest.get(os.path.basename(path), {}).get('sha256') != file_digest(path))
+    ]
+    if not paths:
+        print(f"✅ {directory}: nothing to optimize")
+        return {}
+
+    print(f"🗜️ Optimizing {len(paths)} images in {directory}...")
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        entries = pool.map(optimize_image, paths, [colors] * len(paths))
+        results = {os.path.basename(path): entry for path, entry in zip(paths, entries)}
+    record_results(directory, results)
+
+    before = sum(entry['original_bytes'] for entry in results.values())
+    after = sum(entry['bytes'] for entry in results.values())
+    print(f"✅ {directory}: {before // 1024} KB -> {after // 1024} KB across {len(results)} images")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crop and recompress generated card images")
+    parser.add_argument('directories', nargs='*', default=['tarot_cards'])
+    parser.add_argument('--colors', type=int, help="palette-quantize to this many colours (near-lossless)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="reprocess files already in the manifest")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        optimize_directory(directory, args.colors, args.workers, args.force)
@@ -0,0 +1,111 @@
+"""Per-client token-bucket rate limiting.
+
+Buckets live in a pluggable store. InMemoryBucketStore keeps them in the
+process (bounded, least-recently-used buckets evicted first);
+RedisBucketStore shares them between processes and hosts.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Optional shared backend
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+class InMemoryBucketStore:
+    """Buckets in a bounded LRU map - O(1) per take()"""
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now, cost=1):
+        """Take cost tokens; returns (allowed, seconds until that many are available)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+                # An evicted bucket had been idle longest, so it would have refilled anyway
+                while len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+# Refill and take atomically on the server; idle buckets expire on their own
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = burst
+if bucket[1] then
+    tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+class RedisBucketStore:
+    """Buckets shared through Redis, so every worker enforces the same limit"""
+
+    def __init__(self, url, prefix='tarot:ratelimit:'):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis library not installed")
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_REDIS_TAKE)
+
+    def take(self, key, rate, burst, now, cost=1):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[rate, burst, now, cost])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+
+class TokenBucketLimiter:
+    """Allows `burst` requests at once, refilled at `rate` per second, per key"""
+
+    def __init__(self, rate, burst, store=None):
+        self.rate = rate
+        self.burst = burst
+        self.store = store if store is not None else InMemoryBucketStore()
+        self.limited = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def check(self, key, cost=1):
+        """Returns (allowed, retry_after_seconds) and consumes cost tokens if allowed
+
+        A cost above burst can never be paid; retry_after is then None.
+        """
+        if not self.enabled:
+            return True, 0.0
+        if cost > self.burst:
+            self.limited += 1
+            return False, None
+        allowed, retry_after = self.store.take(key, self.rate, self.burst, time.time(), cost)
+        if not allowed:
+            self.limited += 1
+        return allowed, retry_after
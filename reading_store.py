@@ -0,0 +1,206 @@
+"""Persistent store of served readings, so a shared link never costs a model call.
+
+Every reading gets a short random ID and is saved to SQLite in WAL mode.
+save() only queues the record: a background writer thread commits queued
+readings in batches, one transaction each, so /draw-card never waits on
+disk. Until its batch is committed a reading is served from the pending
+map, so its ID works immediately. Lookups are a primary-key SELECT on a
+per-thread connection, and WAL lets them run while the writer commits.
+open_reading_store() checks that the database can be written before any
+ID is handed out; if it can't, the store is disabled and readings are
+served without an ID rather than with a link that will never work.
+"""
+import atexit
+import json
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+
+from tracing import get_logger
+
+log = get_logger('reading_store')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    spread TEXT,
+    cards TEXT NOT NULL,
+    context TEXT,
+    question_hash TEXT,
+    source TEXT,
+    model TEXT,
+    reading TEXT NOT NULL,
+    duration_ms REAL
+);
+"""
+
+COLUMNS = ('id', 'created', 'spread', 'cards', 'context', 'question_hash', 'source', 'model', 'reading', 'duration_ms')
+
+def new_reading_id():
+    """16 URL-safe characters (96 random bits) - unguessable, short enough to share"""
+    return secrets.token_urlsafe(12)
+
+class ReadingStore:
+    """Queued, batched SQLite writes with reads that see pending readings"""
+
+    def __init__(self, path, batch_size=200, flush_interval=0.05, max_pending=10_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._writer = None
+        self.enabled = True
+        self.saved = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    # WAL is a property of the database file - set once, kept across opens
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(_SCHEMA)
+                    self._ready = True
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def check_writable(self):
+        """Open the database and take its write lock once; raises sqlite3.Error if that fails"""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("ROLLBACK")
+        finally:
+            connection.close()
+
+    def save(self, cards, reading, spread=None, context=None, question_hash=None, source=None, model=None,
+             duration_ms=None):
+        """Queue a reading for writing; returns its ID, or None if the store is disabled or the queue is full"""
+        if not self.enabled:
+            return None
+        record = {
+            'id': new_reading_id(),
+            'created': time.time(),
+            'spread': spread,
+            'cards': json.dumps(list(cards)),
+            'context': context,
+            'question_hash': question_hash,
+            'source': source,
+            'model': model,
+            'reading': reading,
+            'duration_ms': duration_ms,
+        }
+        self._start_writer()
+        with self._pending_lock:
+            self._pending[record['id']] = record
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Never make a request wait on the disk - the reading just isn't shareable
+            with self._pending_lock:
+                del self._pending[record['id']]
+            self.dropped += 1
+            return None
+        return record['id']
+
+    def get(self, reading_id):
+        """The stored reading as a dict (cards decoded), or None; raises sqlite3.Error if the database fails"""
+        if not self.enabled:
+            return None
+        with self._pending_lock:
+            record = self._pending.get(reading_id)
+        if record is None:
+            row = self._reader().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM readings WHERE id = ?", (reading_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = dict(zip(COLUMNS, row))
+        return {**record, 'cards': json.loads(record['cards'])}
+
+    def _start_writer(self):
+        if self._writer is None:
+            with self._init_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name='reading-store-writer', daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        connection = None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                if connection is None:
+                    connection = self._connect()
+                    connection.execute("PRAGMA synchronous=NORMAL")
+                self._write(connection, batch)
+                self.saved += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                log.error(f"❌ Could not store {len(batch)} reading(s): {e}")
+                if connection is not None:
+                    connection.close()
+                connection = None
+            finally:
+                with self._pending_lock:
+                    for record in batch:
+                        self._pending.pop(record['id'], None)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, connection, batch):
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                f"INSERT OR IGNORE INTO readings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(record[column] for column in COLUMNS) for record in batch],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def flush(self, timeout=5.0):
+        """Wait for queued readings to be committed (used at exit and in benchmarks)"""
+        deadline = time.monotonic() + timeout
+        while self._writer is not None and self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {'enabled': self.enabled, 'saved': self.saved, 'pending': pending, 'dropped': self.dropped,
+                'failed': self.failed}
+
+def open_reading_store(path):
+    """A store at path, disabled if the database there can't be written (e.g. a read-only deploy)"""
+    store = ReadingStore(path)
+    try:
+        store.check_writable()
+    except sqlite3.Error as e:
+        store.enabled = False
+        log.warning(f"⚠️ Reading store disabled, readings won't get shareable IDs - can't write {path}: {e}. "
+                    "Set READING_STORE_PATH to a writable location.")
+    atexit.register(store.flush)
+    return store
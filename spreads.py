@@ -0,0 +1,128 @@
+"""Multi-card spreads: layouts, drawing, the spread prompt and its parser.
+
+A whole spread is interpreted in one upstream call. The model is asked for
+an OVERVIEW, one "POSITION n - NAME:" section per card and a KEY TAKEAWAY,
+and parse_spread_reading() splits that text back into per-position
+sections. The template fallback produces the same format, so callers get
+the same structure either way.
+"""
+import random
+import re
+
+SPREADS = {
+    'three-card': {
+        'name': 'Past, Present, Future',
+        'positions': [
+            ("Past", "influences from the past that shaped the situation"),
+            ("Present", "the heart of the situation right now"),
+            ("Future", "where things are heading if nothing changes"),
+        ],
+    },
+    'five-card': {
+        'name': 'Five-Card Cross',
+        'positions': [
+            ("Present", "the current situation"),
+            ("Challenge", "what stands in the way"),
+            ("Past", "what led here"),
+            ("Future", "what is approaching"),
+            ("Outcome", "the likely outcome"),
+        ],
+    },
+    'celtic-cross': {
+        'name': 'Celtic Cross',
+        'positions': [
+            ("Present", "the heart of the matter"),
+            ("Challenge", "what crosses the situation"),
+            ("Foundation", "the root cause beneath it"),
+            ("Recent Past", "what is passing away"),
+            ("Crown", "the best that can be achieved"),
+            ("Near Future", "what comes next"),
+            ("Self", "the person's own attitude"),
+            ("Environment", "the people and surroundings involved"),
+            ("Hopes and Fears", "what the person hopes for or dreads"),
+            ("Outcome", "where it all leads"),
+        ],
+    },
+}
+
+# Stable prefix shared by every spread reading - cached upstream
+SPREAD_SYSTEM_PROMPT = """You are an experienced, wise tarot reader. A person has drawn a multi-card tarot spread and shared a question along with the context of their situation.
+
+Interpret the whole spread, reading each card in light of its position and of the other cards. Use this exact format (use EXACTLY these section headers, one POSITION section per card, in order):
+
+OVERVIEW:
+[2-3 sentences on what the spread says as a whole]
+
+POSITION 1 - <POSITION NAME>:
+[2-3 sentences on this card in this position, specific to their situation]
+
+POSITION 2 - <POSITION NAME>:
+[...and so on for every position in the spread]
+
+KEY TAKEAWAY:
+[One powerful sentence summarizing the main message]
+
+Use a warm, wise, and empowering tone."""
+
+# Tolerates markdown the model adds anyway ("## **OVERVIEW:**") and text on the header line
+_SECTION_HEADER = re.compile(
+    r'^[ \t]*(?:#+[ \t]*)?[*_]*(OVERVIEW|KEY TAKEAWAY|POSITION (\d+)[^:\n]*?)[*_]*[ \t]*:[*_]*[ \t]*',
+    re.MULTILINE | re.IGNORECASE,
+)
+
+def draw_spread(spread_id, cards, rng=random):
+    """Draw one card per position, without replacement"""
+    positions = SPREADS[spread_id]['positions']
+    drawn = rng.sample(cards, len(positions))
+    return [
+        {'position': name, 'description': description, 'card': card}
+        for (name, description), card in zip(positions, drawn)
+    ]
+
+def build_spread_block(spread_id, drawn):
+    """Layout and drawn cards for the user message"""
+    lines = [f"Spread: {SPREADS[spread_id]['name']} ({len(drawn)} cards)", ""]
+    for number, slot in enumerate(drawn, 1):
+        card = slot['card']
+        lines.append(f"POSITION {number} - {slot['position'].upper()} ({slot['description']}): {card.name}")
+        lines.append(f"  Represents: {card.meaning}")
+        lines.append(f"  Key themes: {', '.join(card.keywords)}")
+    return '\n'.join(lines)
+
+def generate_fallback_spread_reading(drawn):
+    """Template spread reading in the same format the model is asked for"""
+    names = ', '.join(slot['card'].name for slot in drawn)
+    sections = [f"OVERVIEW:\nYour spread brings together {names}. Together these cards trace a path from where you have been to where you are heading, inviting you to reflect on each step with an open heart."]
+    for number, slot in enumerate(drawn, 1):
+        card = slot['card']
+        sections.append(
+            f"POSITION {number} - {slot['position'].upper()}:\n"
+            f"In the position of {slot['description']}, {card.name} speaks of {card.meaning.lower()}. "
+            f"Consider how {card.keywords[0]} and {card.keywords[1]} show up here."
+        )
+    final_card = drawn[-1]['card']
+    sections.append(f"KEY TAKEAWAY:\nEmbrace the energy of {final_card.keywords[4]} as you move through what this spread reveals.")
+    return '\n\n'.join(sections)
+
+def parse_spread_reading(text, drawn):
+    """Split a spread reading into overview, per-position sections and takeaway"""
+    sections = {'overview': '', 'positions': [], 'takeaway': ''}
+    by_number = {}
+    headers = list(_SECTION_HEADER.finditer(text))
+    for header, following in zip(headers, headers[1:] + [None]):
+        body = text[header.end():following.start() if following else len(text)].strip()
+        name = header.group(1).upper()
+        if name == 'OVERVIEW':
+            sections['overview'] = body
+        elif name == 'KEY TAKEAWAY':
+            sections['takeaway'] = body
+        else:
+            by_number[int(header.group(2))] = body
+
+    for number, slot in enumerate(drawn, 1):
+        sections['positions'].append({
+            'position': slot['position'],
+            'card': slot['card'].name,
+            'text': by_number.get(number, ''),
+        })
+    return sections
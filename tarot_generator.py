@@ -1,43 +1,174 @@
 import openai
 import requests
 import os
-from typing import List, Dict
+from typing import Any, Dict, Tuple
 import time
+import argparse
 import base64
-import glob
+import filecmp
+import hashlib
+import json
+import random
 import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode, urlparse
 
-# Configure your OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from card_registry import Card, load_card_registry
+from tracing import get_logger, span, start_trace
+from version_index import VersionIndex
+
+# Pillow is optional - without it images are saved exactly as generated
+try:
+    from image_optimizer import optimize_and_record
+    OPTIMIZER_AVAILABLE = True
+except ImportError:
+    OPTIMIZER_AVAILABLE = False
+
+log = get_logger('generator')
 
 # Alternative API configurations
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
 
-# Major Arcana cards with their traditional names
-MAJOR_ARCANA: List[Dict[str, str]] = [
-    {"number": "0", "name": "The Fool", "filename": "00_the_fool"},
-    {"number": "I", "name": "The Magician", "filename": "01_the_magician"},
-    {"number": "II", "name": "The High Priestess", "filename": "02_the_high_priestess"},
-    {"number": "III", "name": "The Empress", "filename": "03_the_empress"},
-    {"number": "IV", "name": "The Emperor", "filename": "04_the_emperor"},
-    {"number": "V", "name": "The Hierophant", "filename": "05_the_hierophant"},
-    {"number": "VI", "name": "The Lovers", "filename": "06_the_lovers"},
-    {"number": "VII", "name": "The Chariot", "filename": "07_the_chariot"},
-    {"number": "VIII", "name": "Strength", "filename": "08_strength"},
-    {"number": "IX", "name": "The Hermit", "filename": "09_the_hermit"},
-    {"number": "X", "name": "Wheel of Fortune", "filename": "10_wheel_of_fortune"},
-    {"number": "XI", "name": "Justice", "filename": "11_justice"},
-    {"number": "XII", "name": "The Hanged Man", "filename": "12_the_hanged_man"},
-    {"number": "XIII", "name": "Death", "filename": "13_death"},
-    {"number": "XIV", "name": "Temperance", "filename": "14_temperance"},
-    {"number": "XV", "name": "The Devil", "filename": "15_the_devil"},
-    {"number": "XVI", "name": "The Tower", "filename": "16_the_tower"},
-    {"number": "XVII", "name": "The Star", "filename": "17_the_star"},
-    {"number": "XVIII", "name": "The Moon", "filename": "18_the_moon"},
-    {"number": "XIX", "name": "The Sun", "filename": "19_the_sun"},
-    {"number": "XX", "name": "Judgement", "filename": "20_judgement"},
-    {"number": "XXI", "name": "The World", "filename": "21_the_world"}
-]
+# Provider endpoints - overridable so benchmarks can point at a local stand-in
+STABILITY_API_BASE = os.getenv("STABILITY_API_BASE", "https://api.stability.ai")
+POLLINATIONS_BASE = os.getenv("POLLINATIONS_BASE", "https://image.pollinations.ai")
+
+# Provider calls: (connect, read) timeouts in seconds and retries on 5xx/connection errors
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "10"))
+PROVIDER_READ_TIMEOUT = float(os.getenv("PROVIDER_READ_TIMEOUT", "180"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# 429s are not retried here - they go back to AdaptiveRateLimiter so every worker slows down
+_http_session = requests.Session()
+_http_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+_http_session.mount("https://", _http_adapter)
+_http_session.mount("http://", _http_adapter)
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """One OpenAI client for the whole run, so its connection pool is reused."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=openai.Timeout(PROVIDER_READ_TIMEOUT, connect=PROVIDER_CONNECT_TIMEOUT),
+                    # The SDK would retry 429s itself; they belong to AdaptiveRateLimiter, see openai_generate
+                    max_retries=0,
+                )
+    return _openai_client
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def openai_generate(**kwargs):
+    """images.generate, retrying connection errors and 5xx like provider_request; 429s are raised."""
+    for attempt in range(PROVIDER_MAX_RETRIES + 1):
+        try:
+            return get_openai_client().images.generate(**kwargs)
+        except (openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == PROVIDER_MAX_RETRIES:
+                raise
+            log.warning(f"🔁 {type(e).__name__} from OpenAI, retrying...")
+        time.sleep(retry_delay(attempt))
+
+def provider_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send a provider request over the pooled session, retrying transient failures.
+
+    The response is streamed - read it with iter_content() or .json().
+    """
+    for attempt in range(PROVIDER_MAX_RETRIES + 1):
+        last_attempt = attempt == PROVIDER_MAX_RETRIES
+        try:
+            response = _http_session.request(method, url, stream=True,
+                                             timeout=(PROVIDER_CONNECT_TIMEOUT, PROVIDER_READ_TIMEOUT), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if last_attempt:
+                raise
+            log.warning(f"🔁 {type(e).__name__} from {urlparse(url).netloc}, retrying...")
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            response.close()
+            log.warning(f"🔁 HTTP {response.status_code} from {urlparse(url).netloc}, retrying...")
+        time.sleep(retry_delay(attempt))
+
+# Everything besides the prompt that decides what image a provider returns. Requests are
+# built from these, so the generation key always matches what was actually sent
+GENERATION_PARAMS: Dict[str, Dict[str, Any]] = {
+    "openai": {"model": "gpt-image-1", "size": "1024x1536", "quality": "high"},
+    "stability": {"model": "stable-diffusion-xl-1024-v1-0", "cfg_scale": 7, "height": 1024, "width": 1024,
+                  "samples": 1, "steps": 30},
+    "free": {"model": "pollinations", "width": 1024, "height": 1024},
+}
+
+def request_params(method: str) -> Dict[str, Any]:
+    """Body or query parameters for a provider: its GENERATION_PARAMS except the model name."""
+    return {name: value for name, value in GENERATION_PARAMS[method].items() if name != "model"}
+
+# Generated images by content key, kept next to the images
+GENERATION_MANIFEST = "generation_manifest.json"
+
+# Major Arcana cards - the same registry the web app serves, see cards.json
+CARD_REGISTRY = load_card_registry()
+MAJOR_ARCANA: Tuple[Card, ...] = CARD_REGISTRY.cards
+
+# Upper bound on retries of one image after the provider rate-limits us
+MAX_RATE_LIMIT_RETRIES = 5
+
+class RateLimited(Exception):
+    """The image provider answered 429; retry_after is in seconds when it said so."""
+
+    def __init__(self, retry_after=None):
+        super().__init__(f"rate limited (retry after {retry_after}s)" if retry_after else "rate limited")
+        self.retry_after = retry_after
+
+def parse_retry_after(headers) -> float:
+    """Seconds from a Retry-After header, None when absent or an HTTP date."""
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+class AdaptiveRateLimiter:
+    """Spaces out calls across threads: backs off on 429s, speeds up on success."""
+
+    def __init__(self, interval: float = 2.0, min_interval: float = 0.0, max_interval: float = 60.0):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate_limited = 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until this caller's slot comes up."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * 0.8)
+
+    def on_rate_limited(self, retry_after: float = None) -> None:
+        with self._lock:
+            self.rate_limited += 1
+            self.interval = min(self.max_interval, max(self.interval * 2, 1.0))
+            pause = retry_after if retry_after is not None else self.interval
+            self._next_slot = max(self._next_slot, time.monotonic() + pause)
 
 def create_prompt(card_name: str) -> str:
     """Create the detailed prompt for each tarot card."""
@@ -60,209 +191,408 @@ def create_prompt(card_name: str) -> str:
     else:
         return base_prompt.format(card_name)
 
-def get_next_version_number(filename: str, output_dir: str = "tarot_cards") -> int:
-    """Get the next version number for a card."""
-    pattern = f"{filename}_v*.png"
-    existing_files = glob.glob(os.path.join(output_dir, pattern))
-    
-    if not existing_files:
-        return 1
-    
-    version_numbers = []
-    for file_path in existing_files:
-        basename = os.path.basename(file_path)
-        match = re.search(r'_v(\d+)\.png$', basename)
+_version_indexes: Dict[str, VersionIndex] = {}
+_version_indexes_lock = threading.Lock()
+
+def get_version_index(output_dir: str = "tarot_cards") -> VersionIndex:
+    """The persistent version index for an output directory."""
+    with _version_indexes_lock:
+        if output_dir not in _version_indexes:
+            os.makedirs(output_dir, exist_ok=True)
+            _version_indexes[output_dir] = VersionIndex(output_dir)
+        return _version_indexes[output_dir]
+
+def get_next_version_number(filename: str, output_dir: str = "tarot_cards", prompt_hash: str = None,
+                            provider: str = None) -> int:
+    """Allocate the next version number for a card from the version index."""
+    return get_version_index(output_dir).allocate(filename, prompt_hash, provider)
+
+def release_version_number(filename: str, version_num: int, output_dir: str = "tarot_cards") -> None:
+    """Give up a version whose image was never written."""
+    get_version_index(output_dir).release(filename, version_num)
+
+# Base64 characters decoded per chunk (a multiple of 4)
+B64_CHUNK_CHARS = 4 * 64 * 1024
+
+def iter_b64_decode(data: str, chunk_chars: int = B64_CHUNK_CHARS):
+    """Decode base64 text piece by piece instead of into one large bytes object."""
+    for start in range(0, len(data), chunk_chars):
+        yield base64.b64decode(data[start:start + chunk_chars])
+
+def write_atomic(filepath: str, chunks) -> int:
+    """Write chunks to a temp file beside filepath, then rename it into place.
+
+    Readers see either the previous file or the complete new one, never a
+    partial write. Returns the number of bytes written.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", suffix=".tmp")
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates owner-only files; images must stay readable by web workers
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+_latest_lock = threading.Lock()
+
+def _latest_version(latest_file: str) -> int:
+    """Version a symlinked _latest points at, 0 when unknown."""
+    if os.path.islink(latest_file):
+        match = re.search(r'_v(\d+)\.png$', os.readlink(latest_file))
         if match:
-            version_numbers.append(int(match.group(1)))
-    
-    return max(version_numbers) + 1 if version_numbers else 1
+            return int(match.group(1))
+    return 0
 
 def update_latest_symlink(filename: str, version_num: int, output_dir: str = "tarot_cards"):
-    """Create or update the _latest symlink/copy."""
-    versioned_file = os.path.join(output_dir, f"{filename}_v{version_num}.png")
+    """Atomically point _latest at a version: symlink, else hardlink, else copy."""
+    versioned_name = f"{filename}_v{version_num}.png"
+    versioned_file = os.path.join(output_dir, versioned_name)
     latest_file = os.path.join(output_dir, f"{filename}_latest.png")
+    if not os.path.exists(versioned_file):
+        return
     
-    # Remove existing latest file if it exists
-    if os.path.exists(latest_file):
-        os.remove(latest_file)
-    
-    # Create a copy (since symlinks can be problematic on some systems)
-    if os.path.exists(versioned_file):
-        import shutil
-        shutil.copy2(versioned_file, latest_file)
-        print(f"📌 Updated latest: {filename}_latest.png")
-
-def generate_image_openai(prompt: str, filename: str, output_dir: str = "tarot_cards") -> bool:
-    """Generate an image using OpenAI's GPT-Image-1 API with versioning."""
+    with _latest_lock:
+        # A variant that finished late must not replace a newer latest
+        if _latest_version(latest_file) > version_num:
+            return
+        
+        # Build the new pointer under a temp name, then rename it over the old one
+        tmp_file = os.path.join(output_dir, f".{filename}_latest.{os.getpid()}.tmp")
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+        try:
+            os.symlink(versioned_name, tmp_file)
+        except (OSError, NotImplementedError):
+            try:
+                os.link(versioned_file, tmp_file)
+            except OSError:
+                # Links unsupported here (some Windows/FAT setups) - fall back to a copy
+                import shutil
+                shutil.copy2(versioned_file, tmp_file)
+        os.replace(tmp_file, latest_file)
+    log.info(f"📌 Updated latest: {filename}_latest.png -> {versioned_name}")
+
+_manifest_lock = threading.Lock()
+
+def generation_key(method: str, prompt: str, variant: int = 1) -> str:
+    """Content address of a generation: provider, model parameters and prompt."""
+    fields = dict(GENERATION_PARAMS[method], provider=method, prompt=prompt)
+    if variant > 1:
+        fields["variant"] = variant
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_generation_manifest(output_dir: str = "tarot_cards") -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(output_dir, GENERATION_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def find_cached_generation(key: str, output_dir: str = "tarot_cards") -> str:
+    """Path of an image already generated for this key, None on a miss."""
+    entry = load_generation_manifest(output_dir).get(key)
+    if entry:
+        filepath = os.path.join(output_dir, entry["file"])
+        if os.path.exists(filepath):
+            return filepath
+    return None
+
+def record_generation(key: str, method: str, filename: str, filepath: str, output_dir: str = "tarot_cards") -> None:
+    """Add a finished image to the manifest; written after every image so runs can resume."""
+    if not key:
+        return
+    entry = dict(GENERATION_PARAMS[method], provider=method, card=filename,
+                 file=os.path.basename(filepath), created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with _manifest_lock:
+        manifest = load_generation_manifest(output_dir)
+        manifest[key] = entry
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(output_dir, GENERATION_MANIFEST))
+
+def optimize_generated_image(filepath: str) -> None:
+    """Crop and recompress a freshly generated image; never fails the generation."""
+    if not OPTIMIZER_AVAILABLE:
+        return
+    try:
+        with span('optimize'):
+            optimize_and_record(filepath)
+    except Exception as e:
+        log.warning(f"⚠️ Could not optimize {os.path.basename(filepath)}: {str(e)}")
+
+def save_generated_image(chunks, filename: str, method: str, write_span: str, output_dir: str = "tarot_cards",
+                         cache_key: str = None) -> str:
+    """Store a new image as the card's next version and point _latest at it.
+
+    Every provider saves through here, so concurrent variants of a card get
+    their own files. Returns the versioned file name.
+    """
+    with span('allocate_version'):
+        version_num = get_next_version_number(filename, output_dir, cache_key, method)
+    versioned_name = f"{filename}_v{version_num}.png"
+    filepath = os.path.join(output_dir, versioned_name)
+    try:
+        with span(write_span) as attributes:
+            attributes['bytes'] = write_atomic(filepath, chunks)
+    except BaseException:
+        release_version_number(filename, version_num, output_dir)
+        raise
+    optimize_generated_image(filepath)
+    with span('record'):
+        get_version_index(output_dir).complete(filename, version_num, os.path.getsize(filepath))
+        record_generation(cache_key, method, filename, filepath, output_dir)
+        update_latest_symlink(filename, version_num, output_dir)
+    return versioned_name
+
+def generate_image_openai(prompt: str, filename: str, output_dir: str = "tarot_cards", cache_key: str = None) -> bool:
+    """Generate an image using OpenAI's GPT-Image-1 API."""
     try:
         os.makedirs(output_dir, exist_ok=True)
         
-        # Get next version number
-        version_num = get_next_version_number(filename, output_dir)
-        versioned_filename = f"{filename}_v{version_num}"
-        
-        response = openai.images.generate(
-            model="gpt-image-1",
-            prompt=prompt,
-            size="1024x1536",
-            quality="high",
-            n=1
-        )
+        params = GENERATION_PARAMS["openai"]
+        with span('provider_call', provider='openai'):
+            response = openai_generate(
+                model=params["model"],
+                prompt=prompt,
+                size=params["size"],
+                quality=params["quality"],
+                n=1
+            )
         
         # GPT-Image-1 returns base64 data
         if hasattr(response, 'data') and response.data:
             image_data_obj = response.data[0]
             
             if hasattr(image_data_obj, 'b64_json') and image_data_obj.b64_json:
-                image_data = base64.b64decode(image_data_obj.b64_json)
-                
-                # Save versioned file
-                filepath = os.path.join(output_dir, f"{versioned_filename}.png")
-                with open(filepath, 'wb') as f:
-                    f.write(image_data)
-                
-                # Update latest file
-                update_latest_symlink(filename, version_num, output_dir)
-                
-                print(f"✅ Successfully generated: {versioned_filename}.png")
+                # The version number is allocated once there is an image to store
+                versioned_name = save_generated_image(iter_b64_decode(image_data_obj.b64_json), filename, "openai",
+                                                      'decode_and_write', output_dir, cache_key)
+                log.info(f"✅ Successfully generated: {versioned_name}")
                 return True
         
-        print(f"❌ No valid image data found in response for {filename}")
+        log.error(f"❌ No valid image data found in response for {filename}")
         return False
             
+    except openai.RateLimitError as e:
+        raise RateLimited(parse_retry_after(e.response.headers))
     except Exception as e:
-        print(f"❌ Error generating {filename}: {str(e)}")
+        log.error(f"❌ Error generating {filename}: {str(e)}")
         return False
 
-def generate_image_stability(prompt: str, filename: str, output_dir: str = "tarot_cards") -> bool:
+def generate_image_stability(prompt: str, filename: str, output_dir: str = "tarot_cards", cache_key: str = None) -> bool:
     """Generate an image using Stability AI's API."""
     try:
         os.makedirs(output_dir, exist_ok=True)
         
-        url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
+        url = f"{STABILITY_API_BASE}/v1/generation/{GENERATION_PARAMS['stability']['model']}/text-to-image"
         
+        # Ask for raw PNG bytes so the image can be streamed straight to disk
         headers = {
-            "Accept": "application/json",
+            "Accept": "image/png",
             "Content-Type": "application/json",
             "Authorization": f"Bearer {STABILITY_API_KEY}",
         }
         
-        body = {
-            "text_prompts": [{"text": prompt}],
-            "cfg_scale": 7,
-            "height": 1024,
-            "width": 1024,
-            "samples": 1,
-            "steps": 30,
-        }
+        body = {"text_prompts": [{"text": prompt}], **request_params("stability")}
         
-        response = requests.post(url, headers=headers, json=body)
+        with span('provider_call', provider='stability') as attributes:
+            response = provider_request("POST", url, headers=headers, json=body)
+            attributes['status'] = response.status_code
         
+        if response.status_code == 429:
+            # Streamed - close it so the pooled connection goes back now, not at garbage collection
+            response.close()
+            raise RateLimited(parse_retry_after(response.headers))
         if response.status_code == 200:
-            data = response.json()
-            image_data = base64.b64decode(data["artifacts"][0]["base64"])
-            
-            filepath = os.path.join(output_dir, f"{filename}.png")
-            with open(filepath, 'wb') as f:
-                f.write(image_data)
-            print(f"✅ Successfully generated: {filename}.png")
+            versioned_name = save_generated_image(response.iter_content(chunk_size=64 * 1024), filename, "stability",
+                                                  'download_and_write', output_dir, cache_key)
+            log.info(f"✅ Successfully generated: {versioned_name}")
             return True
         else:
-            print(f"❌ Stability API error: {response.text}")
+            log.error(f"❌ Stability API error: {response.text}")
             return False
             
+    except RateLimited:
+        raise
     except Exception as e:
-        print(f"❌ Error generating {filename}: {str(e)}")
+        log.error(f"❌ Error generating {filename}: {str(e)}")
         return False
 
-def generate_image_free(prompt: str, filename: str, output_dir: str = "tarot_cards") -> bool:
+def generate_image_free(prompt: str, filename: str, output_dir: str = "tarot_cards", cache_key: str = None) -> bool:
     """Generate an image using free Pollinations API."""
     try:
         os.makedirs(output_dir, exist_ok=True)
         
         encoded_prompt = requests.utils.quote(prompt)
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=1024"
+        image_url = f"{POLLINATIONS_BASE}/prompt/{encoded_prompt}?{urlencode(request_params('free'))}"
         
-        response = requests.get(image_url)
+        with span('provider_call', provider='free') as attributes:
+            response = provider_request("GET", image_url)
+            attributes['status'] = response.status_code
+        if response.status_code == 429:
+            # Streamed - close it so the pooled connection goes back now, not at garbage collection
+            response.close()
+            raise RateLimited(parse_retry_after(response.headers))
         if response.status_code == 200:
-            filepath = os.path.join(output_dir, f"{filename}.png")
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            print(f"✅ Successfully generated: {filename}.png (via Pollinations)")
+            versioned_name = save_generated_image(response.iter_content(chunk_size=64 * 1024), filename, "free",
+                                                  'download_and_write', output_dir, cache_key)
+            log.info(f"✅ Successfully generated: {versioned_name} (via Pollinations)")
             return True
         else:
-            print(f"❌ Failed to generate {filename}")
+            response.close()
+            log.error(f"❌ Failed to generate {filename}")
             return False
             
+    except RateLimited:
+        raise
     except Exception as e:
-        print(f"❌ Error generating {filename}: {str(e)}")
+        log.error(f"❌ Error generating {filename}: {str(e)}")
         return False
 
-def generate_image(prompt: str, filename: str, output_dir: str = "tarot_cards", method: str = "openai") -> bool:
+def generate_image(prompt: str, filename: str, output_dir: str = "tarot_cards", method: str = "openai", cache_key: str = None) -> bool:
     """Generate an image using the specified method."""
     if method == "openai":
-        return generate_image_openai(prompt, filename, output_dir)
+        return generate_image_openai(prompt, filename, output_dir, cache_key)
     elif method == "stability":
-        return generate_image_stability(prompt, filename, output_dir)
+        return generate_image_stability(prompt, filename, output_dir, cache_key)
     elif method == "free":
-        return generate_image_free(prompt, filename, output_dir)
+        return generate_image_free(prompt, filename, output_dir, cache_key)
     else:
-        print(f"❌ Unknown method: {method}")
+        log.error(f"❌ Unknown method: {method}")
         return False
 
-def generate_all_major_arcana(delay_seconds: int = 2, method: str = "openai") -> None:
-    """Generate images for all Major Arcana cards."""
+def reuse_cached_generation(cache_key: str, filename: str, output_dir: str = "tarot_cards") -> bool:
+    """Point latest at an image already generated for this key; False on a miss."""
+    filepath = find_cached_generation(cache_key, output_dir)
+    if not filepath:
+        return False
+    
+    match = re.search(r'_v(\d+)\.png$', filepath)
+    latest_file = os.path.join(output_dir, f"{filename}_latest.png")
+    if match and not (os.path.exists(latest_file) and filecmp.cmp(filepath, latest_file, shallow=False)):
+        update_latest_symlink(filename, int(match.group(1)), output_dir)
+    log.info(f"♻️ Reusing {os.path.basename(filepath)} - same prompt and parameters")
+    return True
+
+def generate_with_backoff(prompt: str, filename: str, limiter: AdaptiveRateLimiter, method: str = "openai", cache_key: str = None) -> bool:
+    """Generate one image, pacing calls through the limiter and retrying 429s."""
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        with span('rate_limit_wait', attempt=attempt):
+            limiter.wait()
+        try:
+            success = generate_image(prompt, filename, method=method, cache_key=cache_key)
+        except RateLimited as e:
+            limiter.on_rate_limited(e.retry_after)
+            log.warning(f"🚦 Rate limited on {filename}; next calls spaced {limiter.interval:.1f}s apart")
+            continue
+        if success:
+            limiter.on_success()
+        return success
+    log.error(f"❌ Giving up on {filename} after {MAX_RATE_LIMIT_RETRIES} rate-limited retries")
+    return False
+
+def generate_all_major_arcana(delay_seconds: int = 2, method: str = "openai", workers: int = 4, variants: int = 1,
+                              force: bool = False) -> None:
+    """Generate images for all Major Arcana cards, `workers` at a time.
+
+    delay_seconds is the starting spacing between calls; it shrinks while
+    calls succeed and grows whenever the provider rate-limits us. Cards
+    whose prompt and parameters match an image on disk are reused unless
+    force is set, so an interrupted run picks up where it stopped.
+    """
+    jobs = [(card, variant) for card in MAJOR_ARCANA for variant in range(1, variants + 1)]
+    limiter = AdaptiveRateLimiter(interval=delay_seconds)
+    
     print("🔮 Starting Major Arcana Tarot Card Generation")
-    print(f"📱 Using gpt model")
+    print(f"📱 Using {method} with {workers} workers, {variants} variant(s) per card")
     print("=" * 50)
     
     successful = 0
     failed = 0
+    reused = 0
+    started = time.time()
     
-    for i, card in enumerate(MAJOR_ARCANA, 1):
-        print(f"\n[{i}/22] Generating {card['name']} ({card['number']}) with gpt...")
-        
-        prompt = create_prompt(card['name'])
-        success = generate_image(prompt, card['filename'], method=method)
-        
-        if success:
-            successful += 1
-        else:
-            failed += 1
-        
-        if i < len(MAJOR_ARCANA):
-            print(f"⏳ Waiting {delay_seconds} seconds before next generation...")
-            time.sleep(delay_seconds)
+    def run(card, variant):
+        card_started = time.time()
+        with start_trace('generate_card', card=card.name, variant=variant, method=method) as trace:
+            prompt = create_prompt(card.name)
+            cache_key = generation_key(method, prompt, variant)
+            if not force and reuse_cached_generation(cache_key, card.filename):
+                return 'reused', 0.0
+            success = generate_with_backoff(prompt, card.filename, limiter, method, cache_key)
+            if not success:
+                trace.error = "generation failed"
+            return success, time.time() - card_started
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, card, variant): card for card, variant in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            card = futures[future]
+            try:
+                success, elapsed = future.result()
+            except Exception as e:
+                print(f"❌ Error generating {card.name}: {str(e)}")
+                success, elapsed = False, 0.0
+            
+            if success == 'reused':
+                reused += 1
+                print(f"[{done}/{len(jobs)}] ♻️ {card.name} ({card.number}) unchanged")
+                continue
+            if success:
+                successful += 1
+            else:
+                failed += 1
+            print(f"[{done}/{len(jobs)}] {'✅' if success else '❌'} {card.name} ({card.number}) in {elapsed:.1f}s")
     
+    total = time.time() - started
     print("\n" + "=" * 50)
     print("🎴 Generation Complete!")
     print(f"✅ Successful: {successful}")
     print(f"❌ Failed: {failed}")
+    print(f"♻️ Reused: {reused}")
+    print(f"🚦 Rate limited: {limiter.rate_limited} time(s)")
+    print(f"⏱️ Total time: {total:.1f}s ({successful / total * 60 if total else 0:.1f} images/min)")
     print(f"📁 Images saved in: ./tarot_cards/")
 
-def generate_single_card(card_name: str, method: str = "openai") -> None:
+def generate_single_card(card_name: str, method: str = "openai", force: bool = False) -> None:
     """Generate a single tarot card by name."""
-    card = None
-    for c in MAJOR_ARCANA:
-        if c['name'].lower() == card_name.lower():
-            card = c
-            break
+    card = CARD_REGISTRY.get(card_name)
     
     if not card:
         print(f"❌ Card '{card_name}' not found in Major Arcana.")
         print("Available cards:")
         for i, c in enumerate(MAJOR_ARCANA, 1):
-            print(f"  {i:2d}. {c['name']}")
+            print(f"  {i:2d}. {c.name}")
         return
     
-    prompt = create_prompt(card['name'])
-    print(f"🔮 Generating {card['name']} using gpt...")
-    success = generate_image(prompt, card['filename'], method=method)
+    prompt = create_prompt(card.name)
+    cache_key = generation_key(method, prompt)
+    if not force and reuse_cached_generation(cache_key, card.filename):
+        print(f"✅ {card.name} is up to date (use --force to generate a new version)")
+        return
+    
+    print(f"🔮 Generating {card.name} using gpt...")
+    with start_trace('generate_card', card=card.name, variant=1, method=method) as trace:
+        success = generate_with_backoff(prompt, card.filename, AdaptiveRateLimiter(interval=0), method, cache_key)
+        if not success:
+            trace.error = "generation failed"
     
     if success:
-        print(f"✅ Successfully generated {card['name']}")
+        print(f"✅ Successfully generated {card.name}")
     else:
-        print(f"❌ Failed to generate {card['name']}")
+        print(f"❌ Failed to generate {card.name}")
 
 def select_single_card() -> str:
     """Interactive card selection."""
@@ -270,7 +600,7 @@ def select_single_card() -> str:
     print("=" * 40)
     
     for i, card in enumerate(MAJOR_ARCANA, 1):
-        print(f"  {i:2d}. {card['name']} ({card['number']})")
+        print(f"  {i:2d}. {card.name} ({card.number})")
     
     while True:
         try:
@@ -279,14 +609,14 @@ def select_single_card() -> str:
             if choice.isdigit():
                 card_index = int(choice) - 1
                 if 0 <= card_index < len(MAJOR_ARCANA):
-                    return MAJOR_ARCANA[card_index]['name']
+                    return MAJOR_ARCANA[card_index].name
                 else:
                     print(f"❌ Please enter a number between 1 and {len(MAJOR_ARCANA)}")
                     continue
             
             for card in MAJOR_ARCANA:
-                if choice.lower() in card['name'].lower():
-                    return card['name']
+                if choice.lower() in card.name.lower():
+                    return card.name
             
             print("❌ Card not found. Try again or use the number.")
             
@@ -297,6 +627,11 @@ def select_single_card() -> str:
             print("❌ Invalid input. Please try again.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Major Arcana Tarot Card Generator")
+    parser.add_argument("--force", action="store_true",
+                        help="generate new images even when an identical prompt was already generated")
+    args = parser.parse_args()
+    
     print("🎴 Major Arcana Tarot Card Generator")
     print("=" * 50)
     
@@ -319,7 +654,8 @@ if __name__ == "__main__":
                 print(f"\n🚀 Generating all 22 Major Arcana cards...")
                 confirm = input("Continue? (y/n): ").strip().lower()
                 if confirm in ['y', 'yes']:
-                    generate_all_major_arcana(delay_seconds=3, method="openai")
+                    generate_all_major_arcana(delay_seconds=3, method="openai",
+                                              workers=int(os.getenv("GENERATION_WORKERS", "4")), force=args.force)
                 else:
                     print("👋 Generation cancelled.")
                 break
@@ -328,7 +664,7 @@ if __name__ == "__main__":
                 selected_card = select_single_card()
                 confirm = input(f"Generate '{selected_card}'? (y/n): ").strip().lower()
                 if confirm in ['y', 'yes']:
-                    generate_single_card(selected_card, method="openai")
+                    generate_single_card(selected_card, method="openai", force=args.force)
                 else:
                     print("👋 Generation cancelled.")
                 break
@@ -0,0 +1,268 @@
+"""Per-request tracing spans and queued structured logging.
+
+Every request (and every generator job) runs inside a trace whose ID is
+taken from the X-Request-ID header when the caller sends a usable one.
+span() times one stage of the work; spans nest through contextvars, so
+they follow each thread and each asyncio task separately.
+
+Finished traces are queued to a background thread that appends them to
+TRACE_EXPORT_PATH as JSON lines, or POSTs batches to TRACE_COLLECTOR_URL.
+Nothing is recorded unless one of them is set. TRACE_SAMPLE_RATE is the
+fraction of traces exported; traces that ended in an error always are.
+
+get_logger() returns a logger whose records go through a queue to a
+listener thread, tagged with the current trace and span IDs, so request
+threads never block on the terminal. LOG_FORMAT=json emits one JSON
+object per line; the default keeps the familiar one-line messages.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')
+TRACE_COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+TRACE_QUEUE_SIZE = 10_000
+TRACE_BATCH_SIZE = 100
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Accept caller IDs that are safe to log and echo back; anything else gets a fresh one
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+def new_id():
+    return uuid.uuid4().hex
+
+def request_id_from(value):
+    """The caller's request ID if it is usable, else a new one"""
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return new_id()
+
+def export_enabled():
+    return bool(TRACE_EXPORT_PATH or TRACE_COLLECTOR_URL)
+
+class Trace:
+    """Spans of one request; only filled in when it may be exported"""
+
+    __slots__ = ('trace_id', 'name', 'attributes', 'spans', 'start', 'started', 'error', 'recording', 'sampled', 'token')
+
+    def __init__(self, name, trace_id=None, **attributes):
+        self.trace_id = trace_id or new_id()
+        self.name = name
+        self.attributes = attributes
+        self.spans = []
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.error = None
+        self.recording = export_enabled()
+        self.sampled = self.recording and random.random() < TRACE_SAMPLE_RATE
+        self.token = None
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': (time.perf_counter() - self.started) * 1000,
+            'error': self.error,
+            'attributes': self.attributes,
+            'spans': self.spans,
+        }
+
+def current_trace():
+    return _current_trace.get()
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+def begin_trace(name, trace_id=None, **attributes):
+    """Start a trace in the current context; pair with end_trace()"""
+    trace = Trace(name, trace_id, **attributes)
+    trace.token = _current_trace.set(trace)
+    return trace
+
+def end_trace(trace, error=None):
+    """Detach the trace from the context and queue it for export if sampled"""
+    if error is not None and trace.error is None:
+        trace.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+    try:
+        _current_trace.reset(trace.token)
+    except ValueError:
+        # Ended from another context (e.g. after a streamed body) - just clear it here
+        _current_trace.set(None)
+    if trace.recording and (trace.sampled or trace.error):
+        _exporter.submit(trace.to_dict())
+
+@contextlib.contextmanager
+def start_trace(name, trace_id=None, **attributes):
+    trace = begin_trace(name, trace_id, **attributes)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        end_trace(trace, error)
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time one stage of the current trace; yields a dict for extra attributes"""
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        yield attributes
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        record = {
+            'name': name,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'start': start,
+            'duration_ms': (time.perf_counter() - started) * 1000,
+            'attributes': attributes,
+        }
+        if error:
+            record['error'] = error
+        trace.spans.append(record)
+
+class TraceExporter:
+    """Writes finished traces from a bounded queue on a daemon thread"""
+
+    def __init__(self, path=None, collector_url=None):
+        self.path = path
+        self.collector_url = collector_url
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            # Never slow a request down for its trace
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._export(batch)
+            except Exception as e:
+                print(f"⚠️ Could not export {len(batch)} trace(s): {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _export(self, batch):
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(trace, default=str) + '\n' for trace in batch))
+        if self.collector_url:
+            body = json.dumps({'traces': batch}, default=str).encode('utf-8')
+            request = urllib.request.Request(self.collector_url, data=body,
+                                             headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(request, timeout=5).close()
+
+    def flush(self, timeout=2.0):
+        """Wait briefly for queued traces to be written (used at exit)"""
+        deadline = time.monotonic() + timeout
+        while self._thread is not None and self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+_exporter = TraceExporter(TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL)
+atexit.register(_exporter.flush)
+
+class _TraceContextFilter(logging.Filter):
+    """Stamp records with the trace and span they were logged in (runs on the caller's thread)"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id()
+        record.span_id = _current_span.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'trace_id': getattr(record, 'trace_id', None),
+            'span_id': getattr(record, 'span_id', None),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        trace_id = getattr(record, 'trace_id', None)
+        message = record.getMessage()
+        return f"{message} [{trace_id[:12]}]" if trace_id else message
+
+_root_logger = logging.getLogger('tarot')
+_log_listener = None
+_log_lock = threading.Lock()
+
+def _setup_logging():
+    global _log_listener
+    with _log_lock:
+        if _log_listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(log_queue)
+        handler.addFilter(_TraceContextFilter())
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+        _root_logger.addHandler(handler)
+        _root_logger.setLevel(LOG_LEVEL.upper())
+        _root_logger.propagate = False
+        _log_listener = logging.handlers.QueueListener(log_queue, output)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+
+def get_logger(name):
+    """Queued, trace-tagged logger; pass extra={'fields': {...}} for structured fields"""
+    _setup_logging()
+    return _root_logger.getChild(name)
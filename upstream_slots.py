@@ -0,0 +1,113 @@
+"""One cap on in-flight upstream calls, shared by threads and event-loop tasks."""
+import asyncio
+import collections
+import threading
+
+class SlotTimeout(TimeoutError):
+    """No upstream slot freed up within the caller's time budget"""
+
+class _Waiter:
+    """A thread (event) or a coroutine (future on its loop) queued for a slot"""
+
+    __slots__ = ('loop', 'event', 'future', 'granted')
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+
+    def grant(self):
+        """Hand this waiter a slot; False if it can no longer take one"""
+        if self.loop is None:
+            self.granted = True
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        except RuntimeError:
+            # Its event loop has closed
+            return False
+        self.granted = True
+        return True
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+class UpstreamSlots:
+    """Counting semaphore that threads and coroutines wait on in one FIFO queue
+
+    Sync routes (Flask, batch workers) call acquire(); async routes await
+    acquire_async(), which waits on a future instead of blocking the event
+    loop. A released slot passes straight to the oldest waiter of either
+    kind, so the cap holds across both and neither can starve the other.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+
+    def _try_acquire(self, loop=None):
+        """Take a free slot now, else queue and return a waiter"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter):
+        """Stop waiting; True if the slot was granted in the meantime (caller now holds it)"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, timeout=None):
+        """Block until a slot is free; False if timeout seconds pass first"""
+        waiter = self._try_acquire()
+        if waiter is None or waiter.event.wait(timeout):
+            return True
+        return self._abandon(waiter)
+
+    async def acquire_async(self, timeout=None):
+        """Wait for a slot without blocking the event loop; False on timeout"""
+        waiter = self._try_acquire(asyncio.get_running_loop())
+        if waiter is None:
+            return True
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._abandon(waiter)
+        except BaseException:
+            # Cancelled while queued - give back a slot that was already handed over
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return
+            self.in_flight -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,147 @@
+"""Persistent index of generated card versions.
+
+Replaces globbing the output directory for "_vN" files. A SQLite database
+next to the images holds a per-card counter and one row per version with
+its metadata. Allocation is a single IMMEDIATE transaction, so parallel
+generators - threads or separate processes - never get the same number.
+If the database goes missing it is rebuilt from the files on disk.
+"""
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+
+INDEX_NAME = "versions.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    card TEXT PRIMARY KEY,
+    last_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    card TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    prompt_hash TEXT,
+    provider TEXT,
+    created REAL NOT NULL,
+    bytes INTEGER,
+    PRIMARY KEY (card, version)
+);
+"""
+
+_VERSION_FILE = re.compile(r'^(.+)_v(\d+)\.png$')
+
+class VersionIndex:
+    """Allocates and records _vN versions for the cards in one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_NAME)
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        # One short-lived connection per call - safe across threads and processes
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    self._initialize(connection)
+                    self._ready = True
+        return connection
+
+    def _initialize(self, connection):
+        connection.executescript(_SCHEMA)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 0:
+                self._rebuild(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _rebuild(self, connection):
+        """Seed the index from the version files already in the directory"""
+        found = 0
+        for path in glob.glob(os.path.join(self.directory, "*_v*.png")):
+            match = _VERSION_FILE.match(os.path.basename(path))
+            if not match or os.path.islink(path):
+                continue
+            card, version = match.group(1), int(match.group(2))
+            stat = os.stat(path)
+            connection.execute(
+                "INSERT OR IGNORE INTO versions (card, version, status, created, bytes) VALUES (?, ?, 'complete', ?, ?)",
+                (card, version, stat.st_mtime, stat.st_size),
+            )
+            connection.execute(
+                "INSERT INTO counters (card, last_version) VALUES (?, ?) "
+                "ON CONFLICT(card) DO UPDATE SET last_version = MAX(last_version, excluded.last_version)",
+                (card, version),
+            )
+            found += 1
+        if found:
+            print(f"🗂️ Rebuilt version index from {found} files in {self.directory}")
+
+    def allocate(self, card, prompt_hash=None, provider=None):
+        """Reserve the next version number for a card"""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT INTO counters (card, last_version) VALUES (?, 1) "
+                "ON CONFLICT(card) DO UPDATE SET last_version = last_version + 1",
+                (card,),
+            )
+            version = connection.execute("SELECT last_version FROM counters WHERE card = ?", (card,)).fetchone()[0]
+            connection.execute(
+                "INSERT INTO versions (card, version, status, prompt_hash, provider, created) "
+                "VALUES (?, ?, 'reserved', ?, ?, ?)",
+                (card, version, prompt_hash, provider, time.time()),
+            )
+            connection.execute("COMMIT")
+            return version
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def complete(self, card, version, size):
+        """Mark a reserved version as written"""
+        connection = self._connect()
+        try:
+            connection.execute(
+                "UPDATE versions SET status = 'complete', bytes = ? WHERE card = ? AND version = ?",
+                (size, card, version),
+            )
+        finally:
+            connection.close()
+
+    def release(self, card, version):
+        """Drop a reservation whose image was never written (the number is not reused)"""
+        connection = self._connect()
+        try:
+            connection.execute(
+                "DELETE FROM versions WHERE card = ? AND version = ? AND status = 'reserved'",
+                (card, version),
+            )
+        finally:
+            connection.close()
+
+    def versions(self, card):
+        """Completed versions of a card, oldest first"""
+        connection = self._connect()
+        try:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                "SELECT * FROM versions WHERE card = ? AND status = 'complete' ORDER BY version",
+                (card,),
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            connection.close()